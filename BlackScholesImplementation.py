@@ -1,4 +1,6 @@
+import numpy as np
 from scipy import stats
+from scipy.special import ndtr
 from numpy import log, exp, sqrt
 
 
@@ -20,6 +22,153 @@ def put_option_price(S, E, T, rf, sigma):
     return -S*stats.norm.cdf(-d1)+E*exp(-rf*T)*stats.norm.cdf(-d2)
 
 
+def d1_d2(S, E, T, rf, sigma):
+    """
+        d1 and d2 parameters for arrays (or broadcastable shapes) of contracts
+    """
+    sigma_sqrt_T = sigma * np.sqrt(T)
+    d1 = (np.log(S / E) + (rf + 0.5 * sigma * sigma) * T) / sigma_sqrt_T
+    return d1, d1 - sigma_sqrt_T
+
+
+def option_prices(S, E, T, rf, sigma):
+    """
+        Call and put prices for a whole option chain in one pass
+
+        S, E, T, rf and sigma can be scalars or NumPy arrays of any broadcastable
+        shapes - d1, d2 and the discount factor are calculated only once and
+        shared between the calls and the puts (no printing)
+    """
+    S, E, T, rf, sigma = (np.asarray(x, dtype=float) for x in (S, E, T, rf, sigma))
+    d1, d2 = d1_d2(S, E, T, rf, sigma)
+    discounted_strike = E * np.exp(-rf * T)
+    # ndtr() is the standard normal N(x) without the overhead of stats.norm
+    call = S * ndtr(d1) - discounted_strike * ndtr(d2)
+    put = discounted_strike * ndtr(-d2) - S * ndtr(-d1)
+    return call, put
+
+
+def option_greeks(S, E, T, rf, sigma):
+    """
+        Prices with the first and second order Greeks for arrays of contracts
+
+        d1, d2, N(d1), N(d2) and the normal pdf n(d1) are evaluated only once,
+        every Greek is derived from them (theta is per year, vega and rho are
+        per unit change of sigma and rf)
+    """
+    S, E, T, rf, sigma = (np.asarray(x, dtype=float) for x in (S, E, T, rf, sigma))
+    sqrt_T = np.sqrt(T)
+    d1, d2 = d1_d2(S, E, T, rf, sigma)
+    discounted_strike = E * np.exp(-rf * T)
+    N_d1 = ndtr(d1)
+    N_d2 = ndtr(d2)
+    pdf_d1 = np.exp(-0.5 * d1 * d1) / np.sqrt(2.0 * np.pi)
+
+    call = S * N_d1 - discounted_strike * N_d2
+    # put-call parity reuses the call price: C - P = S - E*exp(-rT)
+    put = call - S + discounted_strike
+    vega = S * pdf_d1 * sqrt_T
+    time_decay = -S * pdf_d1 * sigma / (2.0 * sqrt_T)
+
+    return {
+        'call': call,
+        'put': put,
+        'call_delta': N_d1,
+        'put_delta': N_d1 - 1.0,
+        'gamma': pdf_d1 / (S * sigma * sqrt_T),
+        'vega': vega,
+        'call_theta': time_decay - rf * discounted_strike * N_d2,
+        'put_theta': time_decay + rf * discounted_strike * (1.0 - N_d2),
+        'call_rho': T * discounted_strike * N_d2,
+        'put_rho': -T * discounted_strike * (1.0 - N_d2),
+        # second order cross and volatility Greeks
+        'vanna': -pdf_d1 * d2 / sigma,
+        'volga': vega * d1 * d2 / sigma,
+    }
+
+
+def implied_volatility(price, S, E, T, rf, call=True, initial_guess=None, tol=1e-10, max_iterations=50):
+    """
+        Implied volatility of a whole surface of option prices at once
+
+        Starts from the Corrado-Miller rational approximation (or from initial_guess,
+        e.g. the previous tick's surface) and runs Halley steps with the analytic vega
+        and volga. Every contract keeps a [low, high] bracket, if a step leaves it
+        bisection is used instead. Only the unconverged contracts are repriced.
+
+        Returns the implied volatilities, the per-contract convergence flags and the
+        number of iterations each contract needed (prices outside the no-arbitrage
+        bounds give NaN and are reported as not converged)
+    """
+    price, S, E, T, rf, call = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (price, S, E, T, rf, call)))
+    shape = price.shape
+    price, S, E, T, rf = (x.ravel() for x in (price, S, E, T, rf))
+    call = call.ravel().astype(bool)
+
+    discounted_strike = E * np.exp(-rf * T)
+    moneyness = S - discounted_strike
+    # every contract is solved on its out-of-the-money side (put-call parity: C - P = S - E*exp(-rT))
+    # so the time value is not lost in the cancellation against the intrinsic value
+    put_side = moneyness > 0
+    target = price + np.where(call, 0.0, moneyness) - np.where(put_side, moneyness, 0.0)
+    valid = (T > 0) & (target > 0) & (target < np.where(put_side, discounted_strike, S))
+    call_price = target + np.where(put_side, moneyness, 0.0)
+
+    # Corrado-Miller initial guess (Brenner-Subrahmanyam when it breaks down)
+    x = call_price - 0.5 * moneyness
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.sqrt(2.0 * np.pi / T) / (S + discounted_strike) * \
+            (x + np.sqrt(np.maximum(x * x - moneyness * moneyness / np.pi, 0.0)))
+        fallback = np.sqrt(2.0 * np.pi / T) * call_price / S
+    sigma = np.where(np.isfinite(sigma) & (sigma > 0), sigma, fallback)
+    if initial_guess is not None:
+        warm = np.broadcast_to(np.asarray(initial_guess, dtype=float), shape).ravel()
+        sigma = np.where(np.isfinite(warm) & (warm > 0), warm, sigma)
+    sigma = np.clip(np.nan_to_num(sigma, nan=0.2), 1e-4, 5.0)
+
+    low = np.zeros_like(sigma)
+    high = np.full_like(sigma, 10.0)
+    converged = np.zeros(sigma.shape, dtype=bool)
+    iterations = np.zeros(sigma.shape, dtype=int)
+    active = np.flatnonzero(valid)
+
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+
+        s = sigma[active]
+        sqrt_T = np.sqrt(T[active])
+        d1, d2 = d1_d2(S[active], E[active], T[active], rf[active], s)
+        vega = S[active] * np.exp(-0.5 * d1 * d1) / np.sqrt(2.0 * np.pi) * sqrt_T
+        model = np.where(put_side[active],
+                         discounted_strike[active] * ndtr(-d2) - S[active] * ndtr(-d1),
+                         S[active] * ndtr(d1) - discounted_strike[active] * ndtr(d2))
+        diff = model - target[active]
+        iterations[active] += 1
+
+        # converged once the Newton correction of sigma is below the tolerance
+        done = np.abs(diff) <= tol * vega
+        converged[active[done]] = True
+
+        # the option price is increasing in sigma so the sign of the error shrinks the bracket
+        high[active] = np.where(diff > 0, s, high[active])
+        low[active] = np.where(diff < 0, s, low[active])
+
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            newton = diff / vega
+            volga = vega * d1 * d2 / s
+            step = newton / (1.0 - 0.5 * newton * volga / vega)
+            updated = s - step
+        outside = ~np.isfinite(updated) | (updated <= low[active]) | (updated >= high[active])
+        updated[outside] = 0.5 * (low[active][outside] + high[active][outside])
+        sigma[active] = np.where(done, s, updated)
+
+        active = active[~done]
+
+    sigma[~valid] = np.nan
+    return sigma.reshape(shape), converged.reshape(shape), iterations.reshape(shape)
+
+
 if __name__ == '__main__':
     # underlying stock price at t=0
     S0 = 100
@@ -36,3 +185,18 @@ if __name__ == '__main__':
           call_option_price(S0, E, T, rf, sigma))
     print("Put option price according to Black-Scholes model: ",
           put_option_price(S0, E, T, rf, sigma))
+
+    # Pricing a whole chain of strikes and expiries at once
+    strikes = np.linspace(50, 150, 101)
+    expiries = np.array([0.25, 0.5, 1.0, 2.0])[:, np.newaxis]
+    calls, puts = option_prices(S0, strikes, expiries, rf, sigma)
+    print("Chain of %d call and put prices, ATM 1 year call: %.4f" % (calls.size, calls[2, 50]))
+
+    # Implied volatility surface - cold start and warm start from the previous tick
+    surface_sigma = 0.15 + 0.1 * (strikes / S0 - 1.0) ** 2 + 0.0 * expiries
+    calls, _ = option_prices(S0, strikes, expiries, rf, surface_sigma)
+    implied, converged, iterations = implied_volatility(calls, S0, strikes, expiries, rf)
+    print("Cold start: %d/%d converged, max iterations %d" % (converged.sum(), converged.size, iterations.max()))
+    calls, _ = option_prices(S0 * 1.001, strikes, expiries, rf, surface_sigma)
+    implied, converged, iterations = implied_volatility(calls, S0 * 1.001, strikes, expiries, rf, initial_guess=implied)
+    print("Warm start: %d/%d converged, max iterations %d" % (converged.sum(), converged.size, iterations.max()))
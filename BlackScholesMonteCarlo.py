@@ -1,6 +1,20 @@
 import numpy as np
 import math
 import time
+from functools import partial
+from running_statistics import simulate_until
+from parallel_simulation import parallel_mean
+
+def payoff_sum(S0, E, T, rf, sigma, sign, n, rng):
+	"""
+		Sum of the max(0,S-E) (sign=1) or max(0,E-S) (sign=-1) payoffs of n simulated paths
+	"""
+	rand = rng.standard_normal(n)
+
+	#equation for the S(t) stock price
+	stock_price = S0*np.exp(T*(rf - 0.5*sigma**2)+sigma*np.sqrt(T)*rand)
+
+	return np.sum(np.maximum(sign*(stock_price - E), 0.0))
  
 class OptionPricing:
     
@@ -12,50 +26,51 @@ class OptionPricing:
 		self.sigma = sigma     
 		self.iterations = iterations 
  
-	def call_option_simulation(self):
-		
-		#we have 2 columns: first with 0s the second column will store the payoff
-		#we need the first column of 0s: payoff function is max(0,S-E) for call option
-		option_data = np.zeros([self.iterations, 2])
-		
-		#dimensions: 1 dimensional array with as many items as the itrations
-		rand = np.random.normal(0, 1, [1, self.iterations])
+	def call_option_simulation(self, seed=None, workers=1):
 		
-		#equation for the S(t) stock price
-		stock_price = self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2)+self.sigma*np.sqrt(self.T)*rand)
- 
-		#we need S-E because we have to calculate the max(S-E,0)
-		option_data[:,1] = stock_price - self.E   
-        
-		#average for the Monte-Carlo method
-		#np.amax() returns the max(0,S-E) according to the formula
-		average = np.sum(np.amax(option_data, axis=1))/float(self.iterations)
+		#average for the Monte-Carlo method - the paths are split into blocks simulated by the workers
+		#the same seed gives the same price for any number of workers
+		average = parallel_mean(partial(payoff_sum, self.S0, self.E, self.T, self.rf, self.sigma, 1.0),
+								self.iterations, seed, workers)
  
 		#have to use the exp(-rT) discount factor
 		return np.exp(-1.0*self.rf*self.T)*average
 		
-	def put_option_simulation(self):
+	def put_option_simulation(self, seed=None, workers=1):
 	
-		#we have 2 columns: first with 0s the second column will store the payoff
-		#we need the first column of 0s: payoff function is max(0,E-S) for put option
-		option_data = np.zeros([self.iterations, 2])
-		
-		#dimensions: 1 dimensional array with as many items as the itrations
-		rand = np.random.normal(0, 1, [1, self.iterations])
-		
-		#equation for the S(t) stock price
-		stock_price = self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2)+self.sigma*np.sqrt(self.T)*rand)
- 
-		#we need E-S because we have to calculate the max(E-S,0)
-		option_data[:,1] = self.E - stock_price  
-        
 		#average for the Monte-Carlo method
-		#np.amax() returns the max(0,E-S) according to the formula
-		average = np.sum(np.amax(option_data, axis=1))/float(self.iterations)
+		average = parallel_mean(partial(payoff_sum, self.S0, self.E, self.T, self.rf, self.sigma, -1.0),
+								self.iterations, seed, workers)
  
 		#have to use the exp(-rT) discount factor
 		return np.exp(-1.0*self.rf*self.T)*average
 
+	def call_option_simulation_streaming(self, target_error=None, target_width=None, confidence=0.95, chunk_size=100000, seed=None):
+		return self.option_simulation_streaming(True, target_error, target_width, confidence, chunk_size, seed)
+
+	def put_option_simulation_streaming(self, target_error=None, target_width=None, confidence=0.95, chunk_size=100000, seed=None):
+		return self.option_simulation_streaming(False, target_error, target_width, confidence, chunk_size, seed)
+
+	def option_simulation_streaming(self, call, target_error=None, target_width=None, confidence=0.95, chunk_size=100000, seed=None):
+		"""
+			Memory-bounded Monte-Carlo: the paths are simulated chunk_size at a time and only
+			the running mean and variance are kept. Stops as soon as the standard error (or the
+			width of the confidence interval) reaches the target, self.iterations is the maximum.
+
+			Returns the price, its standard error and the number of paths actually used
+		"""
+		rng = np.random.default_rng(seed)
+		discount = np.exp(-1.0*self.rf*self.T)
+		sign = 1.0 if call else -1.0
+
+		def discounted_payoffs(n):
+			rand = rng.standard_normal(n)
+			stock_price = self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2)+self.sigma*np.sqrt(self.T)*rand)
+			return discount*np.maximum(sign*(stock_price - self.E), 0.0)
+
+		moments, paths = simulate_until(discounted_payoffs, chunk_size, self.iterations, target_error, target_width, confidence)
+		return moments.mean, moments.standard_error(), paths
+
 if __name__ == "__main__":
 	
 	S0=100					#underlying stock price at t=0
@@ -68,3 +83,7 @@ if __name__ == "__main__":
 	model = OptionPricing(S0,E,T,rf,sigma,iterations)
 	print("Call option price with Monte-Carlo approach: ", model.call_option_simulation()) 
 	print("Put option price with Monte-Carlo approach: ", model.put_option_simulation())
+
+	#stop as soon as the standard error is below 1 cent (at most 100 million paths)
+	streaming = OptionPricing(S0,E,T,rf,sigma,100000000)
+	print("Call option price with streaming Monte-Carlo: %.4f +/- %.4f (%d paths)" % streaming.call_option_simulation_streaming(target_error=0.01))
@@ -1,10 +1,37 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+from functools import partial
+from parallel_simulation import parallel_mean
+from InterestRateModelling import ornstein_uhlenbeck_paths
 
 NUM_OF_SIMULATIONS = 1000
 NUM_OF_POINTS = 200
 
+
+def discount_factor_sum(r0, kappa, theta, sigma, T, n, rng):
+    """
+        Sum of exp(-integral of r(t)) over n simulated Vasicek paths
+    """
+    # (paths x steps) rates from the exact transition density in a single array pass
+    rates = ornstein_uhlenbeck_paths(r0, kappa, theta, sigma, T, NUM_OF_POINTS, n, rng)
+
+    # calculate the integral of the r(t) based on the simulated paths (trapezoidal rule)
+    dt = T / float(NUM_OF_POINTS)
+    integral_sum = (rates.sum(axis=1) - 0.5 * (rates[:, 0] + rates[:, -1])) * dt
+    # present value of a future cash flow
+    return np.sum(np.exp(-integral_sum))
+
+
+def vasicek_log_coefficients(kappa, theta, sigma, T):
+    """
+        log A(T) and B(T) of the Vasicek zero-coupon bond price P(T) = A(T)*exp(-B(T)*r0)
+    """
+    T = np.asarray(T, dtype=float)
+    B = -np.expm1(-kappa * T) / kappa
+    log_A = (theta - sigma ** 2 / (2 * kappa ** 2)) * (B - T) - sigma ** 2 * B ** 2 / (4 * kappa)
+    return log_A, B
+
+
 class BondPricing:
 
     def __init__(self, x0, r0, kappa, theta, sigma):
@@ -14,29 +41,47 @@ class BondPricing:
         self.theta = theta
         self.sigma = sigma
 
-    def monte_carlo_simulation(self, x, r0, kappa, theta, sigma, T=1):
-        dt = T/float(NUM_OF_POINTS)
-        result = []
+    def monte_carlo_simulation(self, x, r0, kappa, theta, sigma, T=1, seed=None, workers=1,
+                               simulations=NUM_OF_SIMULATIONS):
+        # mean because the integral is the average - blocks of paths are simulated by the workers
+        bond_price = x * parallel_mean(partial(discount_factor_sum, r0, kappa, theta, sigma, T),
+                                       simulations, seed, workers)
 
-        for _ in range(NUM_OF_SIMULATIONS):
-            rates = [r0]
-            for _ in range(NUM_OF_POINTS):
-                dr = kappa * (theta - rates[-1]) * dt + sigma * np.sqrt(dt) * np.random.normal()
-                rates.append(rates[-1] + dr)
+        print('Bond price based on Monte-Carlo simulation: $%.2f' % bond_price)
+        return bond_price
 
-            result.append(rates)
+    def zero_coupon_prices(self, maturities):
+        # analytic Vasicek price of the x0 face value bond for every maturity
+        log_A, B = vasicek_log_coefficients(self.kappa, self.theta, self.sigma, maturities)
+        return self.x0 * np.exp(log_A - B * self.r0)
 
-        simulation_data = pd.DataFrame(result)
-        simulation_data = simulation_data.T
+    def zero_coupon_yields(self, maturities):
+        # continuously compounded yields, r0 is the limit for T=0
+        T = np.asarray(maturities, dtype=float)
+        log_A, B = vasicek_log_coefficients(self.kappa, self.theta, self.sigma, T)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(T > 0, (B * self.r0 - log_A) / T, self.r0)
 
-        # calculate the integral of the r(t) based on the simulated paths
-        integral_sum = simulation_data.sum() * dt
-        # present value of a future cash flow
-        present_integral_sum = np.exp(-integral_sum)
-        # mean because the integral is the average
-        bond_price = x * np.mean(present_integral_sum)
+    def forward_rates(self, maturities):
+        # instantaneous forward rates f(0,T) = -d log P(T) / dT
+        T = np.asarray(maturities, dtype=float)
+        decay = np.exp(-self.kappa * T)
+        return self.r0 * decay + self.theta * (1 - decay) - \
+            self.sigma ** 2 / (2 * self.kappa ** 2) * (1 - decay) ** 2
 
-        print('Bond price based on Monte-Carlo simulation: $%.2f' % bond_price)
+    def term_structure(self, maturities):
+        return {
+            'maturities': np.asarray(maturities, dtype=float),
+            'prices': self.zero_coupon_prices(maturities),
+            'yields': self.zero_coupon_yields(maturities),
+            'forwards': self.forward_rates(maturities),
+        }
+
+    def validate(self, T=1, seed=None, workers=1):
+        # the Monte-Carlo price should agree with the closed form within the simulation error
+        closed_form = float(self.zero_coupon_prices(T))
+        monte_carlo = self.monte_carlo_simulation(self.x0, self.r0, self.kappa, self.theta, self.sigma, T, seed, workers)
+        return closed_form, monte_carlo
 
 
 if __name__ == '__main__':
@@ -48,3 +93,8 @@ if __name__ == '__main__':
     sigma = 0.03
     bp = BondPricing(x, r0, kappa, theta, sigma)
     bp.monte_carlo_simulation(x, r0, kappa, theta, sigma)
+    print('Bond price based on the closed form Vasicek formula: $%.2f' % bp.zero_coupon_prices(1))
+
+    # Full term structure in one call
+    curve = bp.term_structure(np.linspace(0, 30, 121))
+    print('30 year yield: %.4f, forward rate: %.4f' % (curve['yields'][-1], curve['forwards'][-1]))
@@ -1,32 +1,132 @@
 import numpy as np
 import pandas as pd
-import yfinance as yf
+import market_data
 import matplotlib.pyplot as plt
+from scipy.signal import lfilter
 
 RISK_FREE_RATE = 0.07
 MONTHS_IN_YEAR = 12
 
+
+def _centered(returns, market_returns):
+    # shifting by the means does not change the slopes but avoids cancellation in the sums
+    Y = np.asarray(returns, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[:, np.newaxis]
+    x = np.asarray(market_returns, dtype=float)
+
+    valid = np.isfinite(Y) & np.isfinite(x)[:, np.newaxis]
+    market_mean = np.nanmean(x)
+    asset_mean = np.nanmean(np.where(valid, Y, np.nan), axis=0)
+    x = np.where(np.isfinite(x), x - market_mean, 0.0)
+    Y = np.where(valid, Y - asset_mean, 0.0)
+    return x, Y, valid, market_mean, asset_mean
+
+
+def _regression_statistics(count, sum_x, sum_xx, sum_y, sum_xy, sum_yy, market_mean, asset_mean):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance_x = sum_xx - sum_x ** 2 / count
+        variance_y = sum_yy - sum_y ** 2 / count
+        covariance = sum_xy - sum_x * sum_y / count
+
+        beta = covariance / variance_x
+        alpha = (sum_y - beta * sum_x) / count + asset_mean - beta * market_mean
+        # residual sum of squares
+        residual = np.maximum(variance_y - beta * covariance, 0.0)
+        return {
+            'alpha': alpha,
+            'beta': beta,
+            'beta_std_error': np.sqrt(residual / (count - 2) / variance_x),
+            'residual_volatility': np.sqrt(residual / (count - 2)),
+            'r_squared': 1 - residual / variance_y,
+            'observations': count,
+        }
+
+
+def capm_regression(returns, market_returns):
+    """
+        Alpha, beta, residual volatility and R^2 of every asset (column of returns) against the market
+
+        One least-squares pass for all the assets: the regression sums are matrix products
+        of the (observations x assets) returns with the market returns. Missing (NaN)
+        observations are left out of the regression of that asset only.
+    """
+    x, Y, valid, market_mean, asset_mean = _centered(returns, market_returns)
+
+    if valid.all():
+        count = np.full(Y.shape[1], float(len(x)))
+        sum_x, sum_xx = np.full(Y.shape[1], x.sum()), np.full(Y.shape[1], x @ x)
+    else:
+        valid = valid.astype(float)
+        count = valid.sum(axis=0)
+        sum_x, sum_xx = x @ valid, (x * x) @ valid
+    sum_y, sum_xy, sum_yy = Y.sum(axis=0), x @ Y, np.einsum('ij,ij->j', Y, Y)
+
+    return _regression_statistics(count, sum_x, sum_xx, sum_y, sum_xy, sum_yy, market_mean, asset_mean)
+
+
+def _rolling_sum(values, window, decay):
+    # sums over the trailing window (NaN until the window is full) or exponentially weighted sums
+    if decay is not None:
+        return lfilter([1.0], [1.0, -decay], values, axis=0)
+    sums = np.cumsum(values, axis=0)
+    sums[window:] -= sums[:-window].copy()
+    sums[:window - 1] = np.nan
+    return sums
+
+
+def rolling_capm_regression(returns, market_returns, window=None, halflife=None):
+    """
+        Regression statistics of every asset at every date, over the trailing window of
+        observations or with exponential weights (the weight halves every halflife observations)
+
+        The sums of x, x^2, y, y^2 and xy are running sums along the time axis, so each
+        date costs O(1) per asset whatever the window length; every statistic is returned
+        as an (observations x assets) array.
+    """
+    if (window is None) == (halflife is None):
+        raise ValueError("Exactly one of window and halflife has to be given")
+    decay = None if halflife is None else 0.5 ** (1.0 / halflife)
+    x, Y, valid, market_mean, asset_mean = _centered(returns, market_returns)
+
+    if valid.all():
+        # the market sums are the same for every asset
+        count = _rolling_sum(np.ones((len(x), 1)), window, decay)
+        sum_x = _rolling_sum(x[:, np.newaxis], window, decay)
+        sum_xx = _rolling_sum(x[:, np.newaxis] ** 2, window, decay)
+    else:
+        valid = valid.astype(float)
+        count = _rolling_sum(valid, window, decay)
+        sum_x = _rolling_sum(x[:, np.newaxis] * valid, window, decay)
+        sum_xx = _rolling_sum(x[:, np.newaxis] ** 2 * valid, window, decay)
+    sum_y = _rolling_sum(Y, window, decay)
+    sum_xy = _rolling_sum(x[:, np.newaxis] * Y, window, decay)
+    sum_yy = _rolling_sum(Y * Y, window, decay)
+
+    statistics = _regression_statistics(count, sum_x, sum_xx, sum_y, sum_xy, sum_yy, market_mean, asset_mean)
+    statistics['observations'] = np.broadcast_to(count, Y.shape)
+    return statistics
+
+
 class CAPM:
 
     def __init__(self, stocks, start_date, end_date):
         self.data = None
+        self.returns = None
         self.stocks = stocks
         self.start_date = start_date
         self.end_date = end_date
     
     def download_data(self):
-        stock_data = {}
-
-        for stock in stocks:
-            ticker = yf.Ticker(stock)
-            stock_data[stock] = ticker.history(start=start_date, end=end_date)['Close']
-
-        return pd.DataFrame(stock_data)
+        # Close prices from the local cache, only the missing date ranges are downloaded
+        return market_data.download_data(self.stocks, self.start_date, self.end_date)
 
     def initialize(self):
         stock_data = self.download_data()
         # Monthly returns instead of daily returns
         stock_data = stock_data.resample('ME').last()
+        # Logarithmic monthly returns of every stock
+        self.returns = np.log(stock_data / stock_data.shift(1))[1:]
 
         self.data = pd.DataFrame({'s_adjclose': stock_data[self.stocks[0]],
                                   'm_adjclose': stock_data[self.stocks[1]]})
@@ -53,6 +153,33 @@ class CAPM:
         print("Expected return: ", expected_return)
         self.plot_regression(alpha, beta)
 
+    def regression_all(self, market=None):
+        """
+            Alpha, beta, residual volatility, R^2 and the CAPM expected return of every stock,
+            one row per stock. The market is a ticker (the second stock by default) or a
+            series of monthly log returns.
+        """
+        if market is None:
+            market = self.stocks[1]
+        market_returns = self.returns[market] if isinstance(market, str) else market.reindex(self.returns.index)
+
+        result = pd.DataFrame(capm_regression(self.returns, market_returns), index=self.returns.columns)
+        result['expected_return'] = RISK_FREE_RATE + result['beta'] * (
+                market_returns.mean() * MONTHS_IN_YEAR - RISK_FREE_RATE)
+        return result
+
+    def rolling_regression(self, window=36, halflife=None, market=None):
+        # Rolling (or exponentially weighted with halflife) statistics, one DataFrame per statistic
+        if market is None:
+            market = self.stocks[1]
+        market_returns = self.returns[market] if isinstance(market, str) else market.reindex(self.returns.index)
+        if halflife is not None:
+            window = None
+
+        statistics = rolling_capm_regression(self.returns, market_returns, window, halflife)
+        return {name: pd.DataFrame(values, index=self.returns.index, columns=self.returns.columns)
+                for name, values in statistics.items()}
+
     def plot_regression(self, alpha, beta):
         fig, axis = plt.subplots(1, figsize=(20, 10))
         axis.scatter(self.data["m_returns"], self.data['s_returns'], label="Data Points")
@@ -79,3 +206,5 @@ if __name__ == '__main__':
     capm.initialize()
     capm.calculate_beta()
     capm.regression()
+    print(capm.regression_all())
+    print(capm.rolling_regression()['beta'].tail())
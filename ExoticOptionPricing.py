@@ -0,0 +1,139 @@
+import numpy as np
+from functools import partial
+from parallel_simulation import run_blocks
+
+# Monitoring dates (daily for a one year option)
+STEPS = 252
+
+
+class PathAggregates:
+    """
+        What the payoffs of the path-dependent options need to know about a path
+
+        Updated step by step, so only a few arrays with one item per path are kept,
+        never the (paths x steps) matrix of prices
+    """
+
+    def __init__(self, S0, paths):
+        self.steps = 0
+        self.log_price = np.full(paths, np.log(S0), dtype=float)
+        self.terminal = np.full(paths, float(S0))
+        self.running_sum = np.zeros(paths)
+        self.running_log_sum = np.zeros(paths)
+        # the initial price counts for the barriers and the lookbacks
+        self.minimum = np.full(paths, float(S0))
+        self.maximum = np.full(paths, float(S0))
+
+    def update(self, log_increments):
+        self.steps += 1
+        self.log_price += log_increments
+        np.exp(self.log_price, out=self.terminal)
+        self.running_sum += self.terminal
+        self.running_log_sum += self.log_price
+        np.minimum(self.minimum, self.terminal, out=self.minimum)
+        np.maximum(self.maximum, self.terminal, out=self.maximum)
+
+    def arithmetic_average(self):
+        return self.running_sum / self.steps
+
+    def geometric_average(self):
+        return np.exp(self.running_log_sum / self.steps)
+
+
+def asian(E, call=True, geometric=False):
+    # option on the average price of the monitoring dates
+    sign = 1.0 if call else -1.0
+
+    def payoff(path):
+        average = path.geometric_average() if geometric else path.arithmetic_average()
+        return np.maximum(sign * (average - E), 0.0)
+    return payoff
+
+
+def barrier(E, level, call=True, kind='up-and-out'):
+    # vanilla payoff that is knocked out (or only knocked in) when the barrier is touched
+    sign = 1.0 if call else -1.0
+    direction, knock = kind.split('-and-')
+
+    def payoff(path):
+        touched = path.maximum >= level if direction == 'up' else path.minimum <= level
+        alive = ~touched if knock == 'out' else touched
+        return np.where(alive, np.maximum(sign * (path.terminal - E), 0.0), 0.0)
+    return payoff
+
+
+def lookback(E=None, call=True):
+    # floating strike (the best price of the path) or fixed strike with the extreme price as the underlying
+    def payoff(path):
+        if E is None:
+            return path.terminal - path.minimum if call else path.maximum - path.terminal
+        return np.maximum(path.maximum - E, 0.0) if call else np.maximum(E - path.minimum, 0.0)
+    return payoff
+
+
+def exotic_payoff_sums(S0, T, rf, sigma, steps, payoffs, n, rng):
+    """
+        Sums and sums of squares of the payoffs over n geometric Brownian motion paths
+
+        The paths are generated one time step at a time: a step needs n new normals and
+        updates the running aggregates in place, so the memory is O(n) for any number of steps.
+    """
+    dt = T / steps
+    drift = (rf - 0.5 * sigma ** 2) * dt
+    path = PathAggregates(S0, n)
+    increments = np.empty(n)
+
+    for _ in range(steps):
+        rng.standard_normal(out=increments)
+        increments *= sigma * np.sqrt(dt)
+        increments += drift
+        path.update(increments)
+
+    values = np.array([payoff(path) for payoff in payoffs])
+    return np.stack([values.sum(axis=1), (values ** 2).sum(axis=1)])
+
+
+class ExoticOptionPricing:
+    """
+        Monte-Carlo prices of path-dependent options under the risk-neutral GBM
+    """
+
+    def __init__(self, S0, T, rf, sigma, iterations, steps=STEPS):
+        self.S0 = S0
+        self.T = T
+        self.rf = rf
+        self.sigma = sigma
+        self.iterations = iterations
+        self.steps = steps
+
+    def price(self, payoffs, seed=None, workers=1):
+        """
+            Prices every payoff of the {name: payoff} dictionary on the same paths,
+            returns {name: (price, standard error)}
+        """
+        names = list(payoffs)
+        sums = np.sum(run_blocks(partial(exotic_payoff_sums, self.S0, self.T, self.rf, self.sigma, self.steps,
+                                         [payoffs[name] for name in names]), self.iterations, seed, workers), axis=0)
+
+        discount = np.exp(-self.rf * self.T)
+        mean = sums[0] / self.iterations
+        variance = (sums[1] - self.iterations * mean ** 2) / (self.iterations - 1)
+        return {name: (discount * m, discount * np.sqrt(v / self.iterations))
+                for name, m, v in zip(names, mean, variance)}
+
+
+if __name__ == '__main__':
+
+    pricing = ExoticOptionPricing(S0=100, T=1, rf=0.05, sigma=0.2, iterations=200000)
+    prices = pricing.price({
+        'arithmetic asian call': asian(100),
+        'geometric asian call': asian(100, geometric=True),
+        'up-and-out call': barrier(100, 130, kind='up-and-out'),
+        'up-and-in call': barrier(100, 130, kind='up-and-in'),
+        'down-and-out put': barrier(100, 80, call=False, kind='down-and-out'),
+        'floating lookback call': lookback(),
+        'fixed lookback put': lookback(100, call=False),
+    }, seed=42)
+
+    for name, (price, error) in prices.items():
+        print('%s: %.4f +/- %.4f' % (name, price, error))
@@ -1,6 +1,34 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from numpy.random import normal
+from scipy.signal import lfilter
+
+
+def ornstein_uhlenbeck_paths(x0, kappa, theta, sigma, T, steps, paths, rng):
+    """
+        Paths of dx = kappa*(theta-x)*dt + sigma*dW sampled from the exact Gaussian transition
+
+            x(t+dt) = theta + (x(t)-theta)*exp(-kappa*dt) + sigma*sqrt((1-exp(-2*kappa*dt))/(2*kappa))*Z
+
+        so there is no discretization bias for any step size. The recursion is linear,
+        lfilter runs it for all the paths at once. Returns a (paths x steps+1) array.
+    """
+    dt = T / float(steps)
+    decay = np.exp(-kappa * dt)
+    if kappa == 0:
+        volatility = sigma * np.sqrt(dt)
+    else:
+        volatility = sigma * np.sqrt(-np.expm1(-2 * kappa * dt) / (2 * kappa))
+
+    shocks = volatility * rng.standard_normal((paths, steps))
+    # y[t] = decay*y[t-1] + shock[t] for the deviation y = x - theta, starting from x0 - theta
+    initial = np.full((paths, 1), decay * (x0 - theta))
+    deviations, _ = lfilter([1.0], [1.0, -decay], shocks, axis=1, zi=initial)
+
+    x = np.empty((paths, steps + 1))
+    x[:, 0] = x0
+    x[:, 1:] = theta + deviations
+    return x
+
 
 class InterestRateModelling:
 
@@ -11,14 +39,10 @@ class InterestRateModelling:
         self.theta = theta
         self.sigma = sigma
 
-    def generate_process(self, dt=0.1, theta=1.2, mu=0.9, sigma=0.9, n=10000):
-        # x(t=0)=0 and initialize x(t) with zeros
-        x = np.zeros(n)
-
-        for t in range(1, n):
-            x[t] = x[t-1] + theta*(mu-x[t-1])*dt + sigma * normal(0, np.sqrt(dt))
-
-        return x
+    def generate_process(self, dt=0.1, theta=1.2, mu=0.9, sigma=0.9, n=10000, seed=None):
+        # x(t=0)=0 - n points with exact transitions between them
+        rng = np.random.default_rng(seed)
+        return ornstein_uhlenbeck_paths(0.0, theta, mu, sigma, dt*(n-1), n-1, 1, rng)[0]
 
     def plot_process(self, x):
         plt.plot(x)
@@ -27,17 +51,15 @@ class InterestRateModelling:
         plt.title('Ornstein-Uhlenbeck Process')
         plt.show()
 
-    def vasicek_model(self, r0, kappa, theta, sigma, T=1., N=1000):
+    def vasicek_model(self, r0, kappa, theta, sigma, T=1., N=1000, seed=None):
 
-        dt = T/float(N)
-        t = np.linspace(0, T, N+1)
-        rates = [r0]
-
-        for _ in range(N):
-            dr = kappa*(theta-rates[-1])*dt + sigma*np.sqrt(dt)*np.random.normal()
-            rates.append(rates[-1]+dr)
+        t, rates = self.vasicek_paths(r0, kappa, theta, sigma, T, N, 1, seed)
+        return t, rates[0]
 
-        return t, rates
+    def vasicek_paths(self, r0, kappa, theta, sigma, T=1., N=1000, paths=1000, seed=None):
+        # (paths x N+1) short rate paths - exact sampling, N can be small without any bias
+        t = np.linspace(0, T, N+1)
+        return t, ornstein_uhlenbeck_paths(r0, kappa, theta, sigma, T, N, paths, np.random.default_rng(seed))
 
     def plot_model(self, t, r):
         plt.plot(t, r)
@@ -0,0 +1,155 @@
+import numpy as np
+from BlackScholesImplementation import option_prices
+
+# Number of time steps in the lattice
+STEPS = 1000
+# Values of the lattice processed at once - small enough to stay in the CPU cache
+CACHE_VALUES = 1 << 18
+
+
+def _backward_induction(S0, E, T, rf, sigma, steps, sign, exercise, trinomial, smooth):
+    """
+        Option values of a block of contracts (vectors of parameters) by backward induction
+
+        The option values of one time step live in one (nodes x contracts) buffer that is
+        updated in place while the lattice shrinks towards the root - O(steps) memory per
+        contract, and the nodes of a step are one contiguous block. exercise is 1 for the
+        contracts exercised early (American puts) and 0 for the others.
+    """
+    dt = T / steps
+    discount = np.exp(-rf * dt)
+    if trinomial:
+        # Boyle's trinomial tree, the nodes at step i are S0 * u^(j-i), j = 0 ... 2i
+        u = np.exp(sigma * np.sqrt(2 * dt))
+        a, b = np.exp(sigma * np.sqrt(dt / 2)), np.exp(rf * dt / 2)
+        p_up = ((b - 1 / a) / (a - 1 / a)) ** 2
+        p_down = ((a - b) / (a - 1 / a)) ** 2
+        p_middle = (1 - p_up - p_down) * discount
+
+        def nodes(i):
+            return 2 * i + 1
+
+        def exponents(i):
+            return np.arange(2 * i + 1) - i
+    else:
+        # Cox-Ross-Rubinstein tree, the nodes at step i are S0 * u^(2j-i), j = 0 ... i
+        u = np.exp(sigma * np.sqrt(dt))
+        p_up = (np.exp(rf * dt) - 1 / u) / (u - 1 / u)
+        p_down = 1 - p_up
+
+        def nodes(i):
+            return i + 1
+
+        def exponents(i):
+            return 2 * np.arange(i + 1) - i
+    p_up, p_down = p_up * discount, p_down * discount
+
+    # the smoothed lattice starts one step before the expiry with the Black-Scholes values
+    last = steps - 1 if smooth else steps
+    prices = S0 * u ** exponents(last)[:, np.newaxis]
+    if smooth:
+        call, put = option_prices(prices, E, dt, rf, sigma)
+        values = np.where(sign > 0, call, put)
+        np.maximum(values, exercise * (E - prices), out=values)
+    else:
+        values = np.maximum(sign * (prices - E), 0.0)
+
+    work = np.empty_like(values)
+    extra = np.empty_like(values) if trinomial else None
+    early_exercise = np.any(exercise != 0)
+    mixed = early_exercise and not np.all(exercise != 0)
+
+    for i in range(last - 1, -1, -1):
+        n = nodes(i)
+        V, W = values[:n], work[:n]
+        if trinomial:
+            np.multiply(values[1:n + 1], p_middle, out=W)
+            np.multiply(values[2:n + 2], p_up, out=extra[:n])
+            W += extra[:n]
+        else:
+            np.multiply(values[1:n + 1], p_up, out=W)
+        V *= p_down
+        V += W
+
+        if early_exercise:
+            prices[:n] *= u
+            np.subtract(E, prices[:n], out=W)
+            if mixed:
+                W *= exercise
+            np.maximum(V, W, out=V)
+
+    return values[0]
+
+
+def lattice_price(S0, E, T, rf, sigma, steps=STEPS, call=True, american=True, trinomial=False, smooth=False):
+    """
+        Binomial (or trinomial) lattice prices for a batch of contracts sharing the step count
+
+        S0, E, T, rf, sigma, call and american may be arrays with one item per contract.
+        smooth replaces the last step with Black-Scholes values, which makes the error
+        decrease smoothly with the number of steps.
+    """
+    S0, E, T, rf, sigma, call, american = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (
+        S0, E, T, rf, sigma, call, american)))
+    shape = S0.shape
+    S0, E, T, rf, sigma, call, american = (x.ravel() for x in (S0, E, T, rf, sigma, call, american))
+    sign = np.where(call != 0, 1.0, -1.0)
+    # early exercise of a call on a stock without dividends is never optimal
+    exercise = ((american != 0) & (sign < 0)).astype(float)
+
+    # the contracts exercised early come first so the other blocks skip the exercise test
+    order = np.argsort(-exercise, kind='stable')
+    width = 2 * steps + 1 if trinomial else steps + 1
+    block = max(CACHE_VALUES // width, 1)
+    result = np.empty(len(S0))
+    for start in range(0, len(S0), block):
+        rows = order[start:start + block]
+        result[rows] = _backward_induction(S0[rows], E[rows], T[rows], rf[rows], sigma[rows], steps,
+                                           sign[rows], exercise[rows], trinomial, smooth)
+    return result.reshape(shape)
+
+
+def richardson_price(S0, E, T, rf, sigma, steps=STEPS, call=True, american=True, trinomial=False):
+    """
+        Richardson extrapolation of the smoothed lattice: 2 * V(steps) - V(steps/2)
+
+        The first order error terms cancel, so a few hundred steps are as accurate as
+        thousands of steps of the plain lattice
+    """
+    fine = lattice_price(S0, E, T, rf, sigma, steps, call, american, trinomial, smooth=True)
+    coarse = lattice_price(S0, E, T, rf, sigma, steps // 2, call, american, trinomial, smooth=True)
+    return 2 * fine - coarse
+
+
+class LatticeOptionPricing:
+    """
+        American and European option prices on binomial and trinomial lattices
+    """
+
+    def __init__(self, S0, E, T, rf, sigma, steps=STEPS):
+        self.S0 = S0
+        self.E = E
+        self.T = T
+        self.rf = rf
+        self.sigma = sigma
+        self.steps = steps
+
+    def binomial_price(self, call=True, american=True):
+        return lattice_price(self.S0, self.E, self.T, self.rf, self.sigma, self.steps, call, american)
+
+    def trinomial_price(self, call=True, american=True):
+        return lattice_price(self.S0, self.E, self.T, self.rf, self.sigma, self.steps, call, american, trinomial=True)
+
+    def richardson_price(self, call=True, american=True, trinomial=False):
+        return richardson_price(self.S0, self.E, self.T, self.rf, self.sigma, self.steps, call, american, trinomial)
+
+
+if __name__ == '__main__':
+
+    lattice = LatticeOptionPricing(S0=100, E=100, T=1, rf=0.05, sigma=0.2)
+    print('European call (binomial): %.4f' % lattice.binomial_price(american=False))
+    print('European call (Black-Scholes): %.4f' % option_prices(100, 100, 1, 0.05, 0.2)[0])
+    print('American put (binomial): %.4f' % lattice.binomial_price(call=False))
+    print('American put (trinomial): %.4f' % lattice.trinomial_price(call=False))
+    lattice = LatticeOptionPricing(S0=100, E=100, T=1, rf=0.05, sigma=0.2, steps=200)
+    print('American put (Richardson, 200 steps): %.4f' % lattice.richardson_price(call=False))
@@ -0,0 +1,95 @@
+import numpy as np
+from functools import partial
+from parallel_simulation import run_blocks
+from StockPriceMonteCarlo import simulate_price_paths
+
+# Bermudan exercise dates (weekly for a one year option)
+EXERCISE_DATES = 50
+# Degree of the polynomial of the continuation value regression
+DEGREE = 3
+
+
+def continuation_value(prices, discounted_cashflows, strike, degree=DEGREE):
+    """
+        Least-squares estimate of the continuation value at the given prices
+
+        The basis is 1, x, ..., x^degree of the moneyness x = S/E (well scaled whatever
+        the price level), and the (degree+1) x (degree+1) normal equations are solved
+        instead of a least-squares problem over all the paths
+    """
+    basis = np.vander(np.asarray(prices, dtype=float) / strike, degree + 1, increasing=True)
+    coefficients = np.linalg.solve(basis.T @ basis, basis.T @ discounted_cashflows)
+    return basis @ coefficients
+
+
+class LeastSquaresMonteCarlo:
+    """
+        Longstaff-Schwartz prices of American (Bermudan) options under the risk-neutral GBM
+
+        The paths are simulated in blocks and stored in single precision (half the memory),
+        the regression at every exercise date uses only the in-the-money paths.
+    """
+
+    def __init__(self, S0, E, T, rf, sigma, iterations, exercise_dates=EXERCISE_DATES, degree=DEGREE):
+        self.S0 = S0
+        self.E = E
+        self.T = T
+        self.rf = rf
+        self.sigma = sigma
+        self.iterations = iterations
+        self.exercise_dates = exercise_dates
+        self.degree = degree
+
+    def simulate(self, seed=None, workers=1):
+        # (iterations x exercise dates+1) prices, the first column is S0
+        dt = self.T / self.exercise_dates
+        task = partial(simulate_price_paths, self.S0, self.rf * dt, self.sigma * np.sqrt(dt), self.exercise_dates,
+                       dtype=np.float32)
+        return np.concatenate(run_blocks(task, self.iterations, seed, workers))
+
+    def price(self, call=False, seed=None, workers=1):
+        """
+            Price, standard error and the exercise boundary (the critical price at every
+            exercise date, NaN when no path is exercised)
+        """
+        paths = self.simulate(seed, workers)
+        sign = 1.0 if call else -1.0
+        discount = np.exp(-self.rf * self.T / self.exercise_dates)
+
+        # value of every path at the current date if the option is held optimally from now on
+        cashflows = np.maximum(sign * (paths[:, -1] - self.E), 0.0).astype(float)
+        boundary = np.full(self.exercise_dates, np.nan)
+        # at expiry every in-the-money option is exercised
+        boundary[-1] = self.E
+
+        for k in range(self.exercise_dates - 1, 0, -1):
+            cashflows *= discount
+            prices = paths[:, k]
+            exercise_value = sign * (prices - self.E)
+            in_the_money = np.flatnonzero(exercise_value > 0)
+            if len(in_the_money) <= self.degree:
+                continue
+
+            continuation = continuation_value(prices[in_the_money], cashflows[in_the_money], self.E, self.degree)
+            exercised = in_the_money[exercise_value[in_the_money] > continuation]
+            cashflows[exercised] = exercise_value[exercised]
+            if len(exercised):
+                boundary[k - 1] = prices[exercised].min() if call else prices[exercised].max()
+
+        cashflows *= discount
+        # the option may also be exercised right away
+        value = max(cashflows.mean(), sign * (self.S0 - self.E))
+        return {
+            'price': value,
+            'standard_error': cashflows.std(ddof=1) / np.sqrt(len(cashflows)),
+            'exercise_times': self.T * np.arange(1, self.exercise_dates + 1) / self.exercise_dates,
+            'exercise_boundary': boundary,
+        }
+
+
+if __name__ == '__main__':
+
+    lsm = LeastSquaresMonteCarlo(S0=100, E=100, T=1, rf=0.05, sigma=0.2, iterations=100000)
+    result = lsm.price(call=False, seed=42)
+    print('American put with Longstaff-Schwartz: %.4f +/- %.4f' % (result['price'], result['standard_error']))
+    print('Exercise boundary: ', np.round(result['exercise_boundary'], 2))
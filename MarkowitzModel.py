@@ -1,8 +1,9 @@
 import numpy as np
-import yfinance as yf
+import market_data
 import pandas as pd
 import matplotlib.pyplot as plt
 import scipy.optimize as optimization
+from covariance_estimators import CovarianceEstimator, DenseCovariance
 
 # Markowitz Model - Investor can decide the risk or expected return
 #   1. Max return with given risk volatilty 
@@ -23,22 +24,172 @@ stocks = ['NVDA', 'AAPL', 'MSFT', 'AMZN', 'GOOG', 'GOOGL', 'META', 'TSLA', 'AVGO
 start_date = '2018-01-01'
 end_date = '2025-01-01'
 
+class EfficientFrontier:
+    """
+        Mean-variance optimizer working on precomputed annual moments
+
+        The mean and the covariance are calculated once, the Sharpe ratio and the variance
+        come with their analytic gradients so SLSQP needs no finite differences. The whole
+        frontier comes from the turning points of the critical line algorithm, the points
+        in between are interpolated exactly (no warm starts needed). The covariance is a matrix
+        or a CovarianceEstimator (e.g. a factor model that is never made dense).
+    """
+
+    def __init__(self, mean, covariance):
+        self.mean = np.asarray(mean, dtype=float)
+        if not isinstance(covariance, CovarianceEstimator):
+            covariance = DenseCovariance(covariance)
+        self.covariance = covariance
+        self.bounds = tuple((0, 1) for _ in range(len(self.mean)))
+        # Sum of weights is 1
+        self.budget = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)}
+
+    @classmethod
+    def from_returns(cls, returns, estimator=None):
+        if estimator is None:
+            covariance = np.asarray(returns.cov()) * NUM_TRADING_DAYS
+        else:
+            covariance = estimator.fit(returns).scaled(NUM_TRADING_DAYS)
+        return cls(np.asarray(returns.mean()) * NUM_TRADING_DAYS, covariance)
+
+    def statistics(self, weights):
+        portfolio_return = weights @ self.mean
+        portfolio_volatility = np.sqrt(self.covariance.portfolio_variance(weights))
+        return np.array([portfolio_return, portfolio_volatility, portfolio_return / portfolio_volatility])
+
+    def negative_sharpe(self, weights):
+        # -S(w) = -w.mu / sqrt(w.Cov.w) and its gradient
+        covariance_weights = self.covariance.dot(weights)
+        portfolio_return = weights @ self.mean
+        portfolio_volatility = np.sqrt(weights @ covariance_weights)
+        gradient = self.mean / portfolio_volatility - portfolio_return * covariance_weights / portfolio_volatility ** 3
+        return -portfolio_return / portfolio_volatility, -gradient
+
+    def variance(self, weights):
+        covariance_weights = self.covariance.dot(weights)
+        return weights @ covariance_weights, 2 * covariance_weights
+
+    def _start(self, x0):
+        return np.full(len(self.mean), 1.0 / len(self.mean)) if x0 is None else x0
+
+    def max_sharpe(self, x0=None):
+        return optimization.minimize(fun=self.negative_sharpe, x0=self._start(x0), jac=True, method='SLSQP',
+                                     bounds=self.bounds, constraints=(self.budget,))
+
+    def min_variance(self, target_return=None, x0=None):
+        constraints = [self.budget]
+        if target_return is not None:
+            constraints.append({'type': 'eq', 'fun': lambda x: x @ self.mean - target_return,
+                                'jac': lambda x: self.mean})
+        return optimization.minimize(fun=self.variance, x0=self._start(x0), jac=True, method='SLSQP',
+                                     bounds=self.bounds, constraints=constraints)
+
+    def turning_points(self):
+        """
+            Critical line algorithm - the long only frontier is piecewise linear in the weights
+
+            Starting from the asset with the highest mean, lambda (the return/variance trade-off)
+            decreases and at every turning point one asset enters or leaves the set of free
+            (non-zero) assets, until lambda=0: the global minimum variance portfolio. Between
+            turning points w(lambda) = alpha + lambda*beta, so every step only needs one solve
+            with the covariance of the free assets and one product with the covariance.
+
+            Returns the lambdas and the (turning points x assets) weights
+        """
+        assets = len(self.mean)
+        free = [int(np.argmax(self.mean))]
+        weights = np.zeros(assets)
+        weights[free[0]] = 1.0
+        lambdas, points = [np.inf], [weights.copy()]
+
+        while True:
+            solved = self.covariance.solve(free, np.column_stack([np.ones(len(free)), self.mean[free]]))
+            inverse_ones, inverse_mean = solved[:, 0], solved[:, 1]
+            c1, c3 = inverse_ones.sum(), inverse_mean.sum()
+            # free weights: alpha + lambda*beta (the sum of the weights is always 1)
+            alpha = inverse_ones / c1
+            beta = inverse_mean - c3 / c1 * inverse_ones
+
+            # Cov[bounded, free] * [alpha, beta] without forming the (bounded x free) block
+            directions = np.zeros((assets, 2))
+            directions[free, 0] = alpha
+            directions[free, 1] = beta
+            bounded = np.setdiff1d(np.arange(assets), free)
+            covariance_directions = self.covariance.dot(directions)[bounded]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # a free weight drops to 0
+                leaving = -alpha / beta
+                # the multiplier of the w=0 bound of an asset drops to 0
+                entering = -(covariance_directions[:, 0] - 1 / c1) / \
+                    (covariance_directions[:, 1] - self.mean[bounded] + c3 / c1)
+
+            # only a weight that falls while lambda decreases can leave (beta above the rounding
+            # noise), and the last free asset never does - the weights must still sum to 1
+            falling = beta > 1e-9 * np.abs(inverse_mean).max()
+            if len(free) == 1:
+                falling[:] = False
+
+            candidates = np.concatenate([np.where(falling, leaving, np.nan), entering])
+            valid = np.isfinite(candidates) & (candidates > 0) & (candidates < lambdas[-1] * (1 - 1e-9))
+            if not np.any(valid):
+                new_lambda, index = 0.0, None
+            else:
+                index = int(np.argmax(np.where(valid, candidates, -np.inf)))
+                new_lambda = candidates[index]
+
+            weights = np.zeros(assets)
+            weights[free] = alpha + new_lambda * beta
+            lambdas.append(new_lambda)
+            points.append(weights)
+
+            if index is None:
+                break
+            if index < len(free):
+                free.pop(index)
+            else:
+                free.append(int(bounded[index - len(free)]))
+
+        return np.array(lambdas), np.array(points)
+
+    def frontier(self, num_points=100):
+        """
+            Minimum variance portfolios for evenly spaced target returns between the global
+            minimum variance portfolio and the best single asset
+
+            Between two turning points the weights are linear in the target return, so the
+            frontier is interpolated exactly from the turning points of the critical line algorithm.
+            Returns the target returns, the volatilities and the (num_points x assets) weights
+        """
+        _, points = self.turning_points()
+        # increasing returns: from the minimum variance portfolio up to the best asset
+        points = points[::-1]
+        point_returns = points @ self.mean
+        targets = np.linspace(point_returns[0], point_returns[-1], num_points)
+
+        upper = np.clip(np.searchsorted(point_returns, targets), 1, len(points) - 1)
+        span = point_returns[upper] - point_returns[upper - 1]
+        fraction = np.where(span > 0, (targets - point_returns[upper - 1]) / np.where(span > 0, span, 1), 0.0)
+        weights = points[upper - 1] + fraction[:, np.newaxis] * (points[upper] - points[upper - 1])
+
+        volatilities = np.sqrt(self.covariance.portfolio_variance(weights))
+        return targets, volatilities, weights
+
+
 class Markowitz:
 
-    def __init__(self, stocks, start_date, end_date):
+    def __init__(self, stocks, start_date, end_date, covariance_estimator=None):
         self.data = None
         self.stocks = stocks
         self.start_date = start_date
         self.end_date = end_date
+        # e.g. LedoitWolfCovariance() or FactorCovariance() for large universes, returns.cov() if None
+        self.covariance_estimator = covariance_estimator
+        self.fitted_covariance = None
 
     def download_data(self):
-        stock_data = {}
-
-        for stock in self.stocks:
-            ticker = yf.Ticker(stock)
-            stock_data[stock] = ticker.history(start=self.start_date, end=self.end_date)['Close']
-
-        return pd.DataFrame(stock_data)
+        # Close prices from the local cache, only the missing date ranges are downloaded
+        return market_data.download_data(self.stocks, self.start_date, self.end_date)
 
     def show_data(self, data):
         data.plot(figsize=(10, 5))
@@ -50,16 +201,28 @@ class Markowitz:
         log_return = np.log(data / data.shift(1))
         return log_return[1:]
 
+    def annual_covariance(self, returns):
+        """
+            Annual covariance of the returns from the covariance estimator, fitted once per returns
+        """
+        if self.fitted_covariance is None or self.fitted_covariance[0] is not returns:
+            if self.covariance_estimator is None:
+                covariance = DenseCovariance(returns.cov() * NUM_TRADING_DAYS)
+            else:
+                covariance = self.covariance_estimator.fit(returns).scaled(NUM_TRADING_DAYS)
+            self.fitted_covariance = (returns, covariance)
+        return self.fitted_covariance[1]
+
     def show_statistics(self, returns):
         # Annual metrics - mean of annual return
         print(returns.mean() * NUM_TRADING_DAYS)
-        print(returns.cov() * NUM_TRADING_DAYS)
+        print(pd.DataFrame(self.annual_covariance(returns).covariance(), index=returns.columns, columns=returns.columns))
 
     def show_mean_variance(self, returns, weights):
         # we are after the annual return
         portfolio_return = np.sum(returns.mean() * weights) * NUM_TRADING_DAYS
         # Co-variance matrix contains relationship between all the assets (sigma)
-        portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(returns.cov() * NUM_TRADING_DAYS, weights)))
+        portfolio_volatility = np.sqrt(self.annual_covariance(returns).portfolio_variance(weights))
         print("Expected portfolio mean (return): ", portfolio_return)
         print("Expected portfolio volatility (standard deviation): ", portfolio_volatility)
 
@@ -72,31 +235,41 @@ class Markowitz:
         plt.colorbar(label='Sharpe Ratio')
         plt.show()
 
-    def generate_portfolios(self, returns):
+    def generate_portfolios(self, returns, num_portfolios=NUM_PORTFOLIOS, dirichlet=False, seed=None, chunk_size=100000):
         """
             Generating portfolio with risk adjustment
+
+            The mean and the covariance are calculated only once and all the weights are drawn
+            as one (portfolios x assets) matrix - uniform and normalized, or Dirichlet distributed
+            (uniform on the simplex). The volatilities are evaluated chunk by chunk to bound
+            the temporary memory.
         """
-        portfolio_means = []
-        portfolio_risks = []
-        portfolio_weights = []
+        rng = np.random.default_rng(seed)
+        mean = np.asarray(returns.mean()) * NUM_TRADING_DAYS
+        covariance = self.annual_covariance(returns)
+        assets = len(mean)
+
+        if dirichlet:
+            portfolio_weights = rng.dirichlet(np.ones(assets), num_portfolios)
+        else:
+            portfolio_weights = rng.random((num_portfolios, assets))
+            portfolio_weights /= portfolio_weights.sum(axis=1, keepdims=True)
 
-        for _ in range(NUM_PORTFOLIOS):
-            w = np.random.random(len(stocks))
-            w /= np.sum(w)
-            portfolio_weights.append(w)
-            portfolio_means.append(np.sum(returns.mean() * w) * NUM_TRADING_DAYS)
-            portfolio_risks.append(np.sqrt(np.dot(w.T, np.dot(returns.cov()
-                                                          * NUM_TRADING_DAYS, w))))
+        portfolio_means = portfolio_weights @ mean
+        portfolio_risks = np.empty(num_portfolios)
+        for start in range(0, num_portfolios, chunk_size):
+            w = portfolio_weights[start:start + chunk_size]
+            # w^T * Cov * w for every row of the chunk
+            portfolio_risks[start:start + chunk_size] = np.sqrt(covariance.portfolio_variance(w))
 
-        return np.array(portfolio_weights), np.array(portfolio_means), np.array(portfolio_risks)
+        return portfolio_weights, portfolio_means, portfolio_risks
 
     def statistics(self, weights, returns):
         """
             Show statistics
         """
         portfolio_return = np.sum(returns.mean() * weights) * NUM_TRADING_DAYS
-        portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(returns.cov()
-                                                            * NUM_TRADING_DAYS, weights)))
+        portfolio_volatility = np.sqrt(self.annual_covariance(returns).portfolio_variance(weights))
         return np.array([portfolio_return, portfolio_volatility,
                      portfolio_return / portfolio_volatility])
 
@@ -110,12 +283,10 @@ class Markowitz:
     # what are the constraints? The sum of weights = 1 !!!
     # f(x)=0 this is the function to minimize
     def optimize_portfolio(self, weights, returns):
-        # Sum of weights is 1
-        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-        # Weights would be in the range of 1, 1 means 100% invested in a single stock
-        bounds = tuple((0, 1) for _ in range(len(stocks)))
-        return optimization.minimize(fun=self.min_function_sharpe, x0=weights[0], args=returns
-                                 , method='SLSQP', bounds=bounds, constraints=constraints)
+        # Sum of weights is 1, weights would be in the range of 1, 1 means 100% invested in a single stock
+        # The moments are calculated once and the Sharpe ratio gradient is analytic
+        return EfficientFrontier(np.asarray(returns.mean()) * NUM_TRADING_DAYS,
+                                 self.annual_covariance(returns)).max_sharpe(weights[0])
 
     def print_optimal_portfolio(self, optimum, returns):
         print("Optimal portfolio: ", optimum['x'].round(3))
@@ -145,3 +316,12 @@ if __name__ == '__main__':
     optimum = markowitz.optimize_portfolio(pweights, log_daily_returns)
     markowitz.print_optimal_portfolio(optimum, log_daily_returns)
     markowitz.show_optimal_portfolio(optimum, log_daily_returns, means, risks)
+
+    frontier = EfficientFrontier(log_daily_returns.mean() * NUM_TRADING_DAYS,
+                                 markowitz.annual_covariance(log_daily_returns))
+    target_returns, volatilities, _ = frontier.frontier()
+    # a few frontier points cross-checked against the optimizer
+    for k in (0, len(target_returns) // 2, len(target_returns) - 1):
+        print("Frontier volatility %.6f, SLSQP volatility %.6f at return %.4f" % (
+            volatilities[k], np.sqrt(frontier.min_variance(target_returns[k]).fun), target_returns[k]))
+    markowitz.show_portfolios(target_returns, volatilities)
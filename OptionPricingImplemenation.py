@@ -1,6 +1,12 @@
 import numpy as np
 from scipy import stats
+from scipy.special import ndtri
 from numpy import log, exp, sqrt
+import time
+from functools import partial
+from BlackScholesImplementation import option_prices, option_greeks
+from BlackScholesMonteCarlo import payoff_sum
+from parallel_simulation import parallel_mean
  
 class OptionPricing:
 	"""
@@ -32,41 +38,114 @@ class OptionPricing:
     	# Use the N(x) to calculate the price of the option
 		return -self.S0*stats.norm.cdf(-d1) + self.E*exp(-self.rf*self.T)*stats.norm.cdf(-d2)
 
-	def call_option_simulation(self):
-		
-		# We have 2 columns - first with 0s and the second with the payoff
-		# First column of 0s: payoff function is max(0,S-E) for call option
-		option_data = np.zeros([self.iterations, 2])
-		rand = np.random.normal(0, 1, [1, self.iterations])
-		
-		# Equation for the S(t) stock price
-		stock_price = self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2)+self.sigma*np.sqrt(self.T)*rand)
+	def option_prices(self):
+		# Call and put prices in one pass - S0, E, T, rf and sigma may be arrays of a whole chain
+		return option_prices(self.S0, self.E, self.T, self.rf, self.sigma)
+
+	def greeks(self):
+		# Price, delta, gamma, vega, theta, rho, vanna and volga from a single evaluation of d1 and d2
+		return option_greeks(self.S0, self.E, self.T, self.rf, self.sigma)
+
+	def finite_difference_greeks(self, bump=1e-4):
+		"""
+			Bump-and-reprice Greeks of the call option (central differences) - reference for greeks()
+		"""
+		def price(S0=self.S0, T=self.T, rf=self.rf, sigma=self.sigma):
+			return option_prices(S0, self.E, T, rf, sigma)[0]
 
-		option_data[:,1] = stock_price - self.E   
-        
-		# np.amax() returns the max(0,S-E) according to the formula
-		average = np.sum(np.amax(option_data, axis=1))/float(self.iterations)
+		base = price()
+		up_S, down_S = price(S0=self.S0*(1+bump)), price(S0=self.S0*(1-bump))
+		dS = self.S0*bump
+		up_sigma, down_sigma = price(sigma=self.sigma+bump), price(sigma=self.sigma-bump)
+		up_rf, down_rf = price(rf=self.rf+bump), price(rf=self.rf-bump)
+
+		return {
+			'call': base,
+			'call_delta': (up_S - down_S) / (2*dS),
+			'gamma': (up_S - 2*base + down_S) / (dS*dS),
+			'vega': (up_sigma - down_sigma) / (2*bump),
+			'call_theta': (price(T=self.T-bump) - base) / bump,
+			'call_rho': (up_rf - down_rf) / (2*bump),
+			'volga': (up_sigma - 2*base + down_sigma) / (bump*bump),
+		}
+
+	def call_option_simulation(self, seed=None, workers=1):
+		
+		# The paths are simulated in blocks on the workers, each block with its own random stream
+		# np.maximum() returns the max(0,S-E) according to the formula - no need for a column of 0s
+		average = parallel_mean(partial(payoff_sum, self.S0, self.E, self.T, self.rf, self.sigma, 1.0),
+								self.iterations, seed, workers)
  
 		return np.exp(-1.0*self.rf*self.T)*average
 		
-	def put_option_simulation(self):
+	def put_option_simulation(self, seed=None, workers=1):
 	
-		# We have 2 columns - first with 0s and the second with the payoff
-		# First column of 0s: payoff function is max(0,E-S) for put option
-		option_data = np.zeros([self.iterations, 2])
-		rand = np.random.normal(0, 1, [1, self.iterations])
-		
-		# Equation for the S(t) stock price
-		stock_price = self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2)+self.sigma*np.sqrt(self.T)*rand)
- 
-		option_data[:,1] = self.E - stock_price  
-
-		# np.amax() returns the max(0,E-S) according to the formula
-		average = np.sum(np.amax(option_data, axis=1))/float(self.iterations)
+		# np.maximum() returns the max(0,E-S) according to the formula
+		average = parallel_mean(partial(payoff_sum, self.S0, self.E, self.T, self.rf, self.sigma, -1.0),
+								self.iterations, seed, workers)
  
 		# Use the exp(-rT) discount factor
 		return np.exp(-1.0*self.rf*self.T)*average
 
+	def call_option_simulation_vr(self, antithetic=None, control_variate=True, quasi_random=False, seed=None):
+		# Variance-reduced Monte-Carlo price of the call option, returns (price, standard error)
+		return self._variance_reduced_simulation(True, antithetic, control_variate, quasi_random, seed)
+
+	def put_option_simulation_vr(self, antithetic=None, control_variate=True, quasi_random=False, seed=None):
+		# Variance-reduced Monte-Carlo price of the put option, returns (price, standard error)
+		return self._variance_reduced_simulation(False, antithetic, control_variate, quasi_random, seed)
+
+	def _terminal_prices(self, rand):
+		# Equation for the S(T) stock price
+		return self.S0*np.exp(self.T*(self.rf - 0.5*self.sigma**2) + self.sigma*np.sqrt(self.T)*rand)
+
+	def _variance_reduced_simulation(self, call, antithetic, control_variate, quasi_random, seed, replications=16):
+		"""
+			Monte-Carlo with antithetic variates, control variate and randomised quasi-Monte-Carlo
+
+			With quasi_random the normals come from a Sobol sequence, the standard error is
+			estimated from independent random shifts (replications) of the sequence. Every
+			replication uses the next power of 2 of iterations/replications points, so at least
+			iterations paths are simulated. antithetic defaults to True for pseudo-random
+			normals and to False for Sobol points (which are already balanced - pairing
+			them only halves the points per shift).
+		"""
+		if antithetic is None:
+			antithetic = not quasi_random
+		rng = np.random.default_rng(seed)
+		# with antithetic variates every draw gives 2 paths (Z and -Z)
+		draws = self.iterations // 2 if antithetic else self.iterations
+
+		if not quasi_random:
+			return self._estimate(rng.standard_normal(draws), call, antithetic, control_variate)
+
+		# Sobol points are balanced for powers of 2 only - round up so no requested path is dropped
+		sobol = stats.qmc.Sobol(d=1, scramble=False).random_base2(int(np.ceil(np.log2(max(-(-draws // replications), 2)))))[:, 0]
+		estimates = [self._estimate(ndtri((sobol + rng.random()) % 1.0), call, antithetic, control_variate)[0]
+					 for _ in range(replications)]
+
+		return np.mean(estimates), np.std(estimates, ddof=1)/np.sqrt(replications)
+
+	def _estimate(self, rand, call, antithetic, control_variate):
+		discount = np.exp(-1.0*self.rf*self.T)
+		sign = 1.0 if call else -1.0
+
+		stock_price = self._terminal_prices(rand)
+		payoff = discount*np.maximum(sign*(stock_price - self.E), 0.0)
+		# the discounted stock price is a martingale: its expected value is S0
+		control = discount*stock_price
+
+		if antithetic:
+			antithetic_price = self._terminal_prices(-rand)
+			payoff = 0.5*(payoff + discount*np.maximum(sign*(antithetic_price - self.E), 0.0))
+			control = 0.5*(control + discount*antithetic_price)
+
+		if control_variate:
+			covariance = np.cov(payoff, control)
+			payoff = payoff - covariance[0, 1]/covariance[1, 1]*(control - self.S0)
+
+		return np.mean(payoff), np.std(payoff, ddof=1)/np.sqrt(len(payoff))
+
 if __name__ == "__main__":
 	
 	# Underlying stock price at t=0
@@ -89,3 +168,25 @@ if __name__ == "__main__":
 	
 	print("Call option price with Monte-Carlo approach: ", model.call_option_simulation()) 
 	print("Put option price with Monte-Carlo approach: ", model.put_option_simulation())
+
+	# Variance reduction - the same standard error with a fraction of the paths
+	reduced = OptionPricing(S0, E, T, rf, sigma, iterations // 100)
+	print("Call option price with antithetic and control variates: %.4f +/- %.4f" % reduced.call_option_simulation_vr(seed=42))
+	print("Call option price with quasi-Monte-Carlo: %.4f +/- %.4f" % reduced.call_option_simulation_vr(quasi_random=True, seed=42))
+
+	# Benchmark - analytic Greeks against bump-and-reprice on a chain of 1 million contracts
+	contracts = 1000000
+	chain = OptionPricing(S0, np.random.uniform(50, 150, contracts), np.random.uniform(0.1, 2, contracts),
+		rf, np.random.uniform(0.1, 0.5, contracts), iterations)
+
+	start = time.perf_counter()
+	analytic = chain.greeks()
+	analytic_time = time.perf_counter() - start
+
+	start = time.perf_counter()
+	bumped = chain.finite_difference_greeks()
+	bumped_time = time.perf_counter() - start
+
+	print("Analytic Greeks: %.3fs, finite differences: %.3fs (%.1fx faster)" % (analytic_time, bumped_time, bumped_time / analytic_time))
+	for greek in ('call_delta', 'vega', 'call_rho', 'call_theta'):
+		print("Max difference in %s: %.2e" % (greek, np.max(np.abs(analytic[greek] - bumped[greek]))))
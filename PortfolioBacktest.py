@@ -0,0 +1,106 @@
+import time
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from MarkowitzModel import EfficientFrontier, Markowitz, NUM_TRADING_DAYS, stocks
+from running_statistics import WindowMoments
+
+# Length of the estimation window in trading days
+WINDOW = 252
+# Re-optimize every month
+REBALANCE_EVERY = 21
+# Recalculate the window sums from scratch after this many rebalances
+REFRESH_EVERY = 50
+
+
+class RollingBacktest:
+    """
+        Re-optimizes the Markowitz portfolio on a rolling (or expanding) window of log returns
+
+        The window mean and covariance are updated incrementally - the days entering and
+        leaving the window are rank-k updates of the sums - and every optimization is warm
+        started from the previous weights. Between the rebalance dates the portfolio is held
+        (the weights drift with the prices).
+    """
+
+    def __init__(self, returns, window=WINDOW, rebalance_every=REBALANCE_EVERY, expanding=False,
+                 objective='max_sharpe', refresh_every=REFRESH_EVERY):
+        self.returns = returns
+        self.window = window
+        self.rebalance_every = rebalance_every
+        self.expanding = expanding
+        self.objective = objective
+        self.refresh_every = refresh_every
+
+    def optimize(self, moments, x0):
+        frontier = EfficientFrontier(moments.mean() * NUM_TRADING_DAYS, moments.covariance() * NUM_TRADING_DAYS)
+        if self.objective == 'min_variance':
+            return frontier.min_variance(x0=x0)['x']
+        return frontier.max_sharpe(x0)['x']
+
+    def run(self):
+        """
+            Returns the realized daily portfolio returns, the weights and the turnover at every
+            rebalance date and the time every rebalance step took
+        """
+        data = np.asarray(self.returns, dtype=float)
+        days, assets = data.shape
+        rebalance_dates = range(self.window, days, self.rebalance_every)
+
+        moments = WindowMoments(assets)
+        moments.add(data[:self.window])
+
+        realized = np.empty(days - self.window)
+        weights = np.empty((len(rebalance_dates), assets))
+        turnover = np.empty(len(rebalance_dates))
+        timing = np.empty(len(rebalance_dates))
+        # weights just before the rebalance - nothing is invested at the start
+        drifted = np.zeros(assets)
+        previous = self.window
+
+        for step, t in enumerate(rebalance_dates):
+            start = time.perf_counter()
+
+            # slide the window from the previous rebalance date to this one
+            window_start = 0 if self.expanding else t - self.window
+            if self.refresh_every and step % self.refresh_every == 0:
+                moments.reset(data[window_start:t])
+            else:
+                moments.add(data[previous:t])
+                if not self.expanding:
+                    moments.remove(data[previous - self.window:window_start])
+            previous = t
+
+            w = self.optimize(moments, weights[step - 1] if step else None)
+            weights[step] = w
+            turnover[step] = np.abs(w - drifted).sum()
+            timing[step] = time.perf_counter() - start
+
+            # hold the portfolio until the next rebalance date: log returns -> gross returns
+            values = w * np.cumprod(np.exp(data[t:t + self.rebalance_every]), axis=0)
+            portfolio_values = np.concatenate([[1.0], values.sum(axis=1)])
+            realized[t - self.window:t - self.window + len(values)] = portfolio_values[1:] / portfolio_values[:-1] - 1
+            drifted = values[-1] / values[-1].sum()
+
+        index = getattr(self.returns, 'index', None)
+        columns = getattr(self.returns, 'columns', None)
+        dates = index[list(rebalance_dates)] if index is not None else list(rebalance_dates)
+        return {
+            'returns': pd.Series(realized, index=index[self.window:] if index is not None else None),
+            'weights': pd.DataFrame(weights, index=dates, columns=columns),
+            'turnover': pd.Series(turnover, index=dates),
+            'timing': pd.Series(timing, index=dates),
+        }
+
+
+if __name__ == '__main__':
+    markowitz = Markowitz(stocks, '2010-01-01', '2025-01-01')
+    log_daily_returns = markowitz.calculate_return(markowitz.download_data()).dropna()
+
+    backtest = RollingBacktest(log_daily_returns).run()
+    print("Annual return: %.4f" % (backtest['returns'].mean() * NUM_TRADING_DAYS))
+    print("Average turnover per rebalance: %.4f" % backtest['turnover'].mean())
+    print("Average time per rebalance: %.6fs" % backtest['timing'].mean())
+
+    (1 + backtest['returns']).cumprod().plot(figsize=(10, 5))
+    plt.show()
@@ -1,37 +1,80 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+from functools import partial
+from parallel_simulation import run_blocks
 
 NUM_OF_SIMULATIONS = 1000
 N = 252
 
+
+def simulate_price_paths(S0, mu, sigma, steps, n, rng, dtype=np.float64):
+    """
+        n price paths of the given number of steps, one path per row
+
+        S0, mu and sigma may be arrays of m parameter sets, the result then has the
+        shape (m, n, steps+1). The normals are drawn straight into one preallocated
+        array which then becomes the log prices (cumulative sum of the log increments)
+        and the prices - in place, no temporary (paths x steps) arrays.
+    """
+    S0, mu, sigma = (np.asarray(x, dtype=dtype) for x in (S0, mu, sigma))
+    batch = np.broadcast(S0, mu, sigma).shape
+    # parameters broadcast against the (paths, steps) axes
+    S0, mu, sigma = (x.reshape(x.shape + (1, 1)) for x in (S0, mu, sigma))
+
+    paths = np.empty(batch + (n, steps + 1), dtype=dtype)
+    rng.standard_normal(out=paths, dtype=dtype)
+
+    paths *= sigma
+    paths += mu - 0.5 * sigma ** 2
+    paths[..., 0] = 0.0
+    np.cumsum(paths, axis=-1, out=paths)
+    np.exp(paths, out=paths)
+    paths *= S0
+    return paths
+
+
+def summary_statistics(paths, quantiles=(0.05, 0.5, 0.95)):
+    """
+        Mean path, quantile bands and the terminal distribution of simulated paths
+
+        Statistics are taken over the paths axis (the second to last one) so a batch
+        of parameter sets is summarised at once
+    """
+    terminal = paths[..., -1]
+    return {
+        'mean_path': paths.mean(axis=-2),
+        'quantile_bands': dict(zip(quantiles, np.quantile(paths, quantiles, axis=-2))),
+        'terminal_mean': terminal.mean(axis=-1),
+        'terminal_std': terminal.std(axis=-1),
+        'terminal_quantiles': dict(zip(quantiles, np.quantile(terminal, quantiles, axis=-1))),
+    }
+
+
 class StockPriceMonteCarlo:
     def __init__(self, S0, mu, sigma):
+        # Scalars or arrays with one item per parameter set
         self.S0 = S0
         self.mu = mu
         self.sigma = sigma
 
-    def stock_monte_carlo(self):
+    def simulate(self, simulations=NUM_OF_SIMULATIONS, steps=N, dtype=np.float64, seed=None, workers=1):
+        # blocks of paths are simulated by the workers with independent random streams
+        result = run_blocks(partial(simulate_price_paths, self.S0, self.mu, self.sigma, steps, dtype=dtype),
+                            simulations, seed, workers)
+        return result[0] if len(result) == 1 else np.concatenate(result, axis=-2)
 
-        result = []
+    def statistics(self, simulations=NUM_OF_SIMULATIONS, steps=N, quantiles=(0.05, 0.5, 0.95),
+                   dtype=np.float64, seed=None, workers=1):
+        return summary_statistics(self.simulate(simulations, steps, dtype, seed, workers), quantiles)
 
-        for _ in range(NUM_OF_SIMULATIONS):
-            prices = [S0]
-            for _ in range(N):
-                stock_price = prices[-1] * np.exp((self.mu - 0.5 * self.sigma ** 2) + sigma * np.random.normal())
-                prices.append(stock_price)
+    def stock_monte_carlo(self, seed=None, workers=1):
 
-            result.append(prices)
+        statistics = self.statistics(seed=seed, workers=workers)
 
-        simulation_data = pd.DataFrame(result)
-        simulation_data = simulation_data.T
-
-        simulation_data['mean'] = simulation_data.mean(axis=1)
-
-        plt.plot(simulation_data['mean'])
+        plt.plot(statistics['mean_path'])
         plt.show()
 
-        print('Future stock price: %.2f' % float(simulation_data['mean'].iloc[0]))
+        print('Future stock price: %.2f' % float(statistics['terminal_mean']))
 
 
 if __name__ == '__main__':
@@ -41,3 +84,7 @@ if __name__ == '__main__':
     sigma = 0.01
     sp_montecarlo = StockPriceMonteCarlo(S0, mu, sigma)
     sp_montecarlo.stock_monte_carlo()
+
+    # Many parameter sets in one batch, single precision
+    batch = StockPriceMonteCarlo(S0, np.linspace(-0.001, 0.001, 5), np.linspace(0.005, 0.03, 5))
+    print('Future stock prices: ', batch.statistics(dtype=np.float32, seed=42)['terminal_mean'])
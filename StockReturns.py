@@ -1,25 +1,22 @@
 import numpy as np
-import pandas as pd
-import yfinance as yf
+import market_data
 import matplotlib.pyplot as plt
 from scipy.stats import norm
+from running_statistics import StreamingReturns
 
 class StockReturnsCalculation:
 
     def __init__(self, stocks, start_date, end_date):
         self.data = None
+        # moments of the log returns, updated as new prices arrive
+        self.statistics = None
         self.stocks = stocks
         self.start_date = start_date
         self.end_date = end_date
     
     def download_data(self):
-        stock_data = {}
-
-        for stock in stocks:
-            ticker = yf.Ticker(stock)
-            stock_data[stock] = ticker.history(start=start_date, end=end_date)['Close']
-
-        return pd.DataFrame(stock_data)
+        # Close prices from the local cache, only the missing date ranges are downloaded
+        return market_data.download_data(self.stocks, self.start_date, self.end_date)
 
     def show_data(self, stock_data):
         stock_data.plot(figsize=(10, 5))
@@ -31,6 +28,13 @@ class StockReturnsCalculation:
         #stock_data['Close'] = np.log(stock_data['Close'] / stock_data['Close'].shift(1))
         return log_return
 
+    def update_statistics(self, prices):
+        # New close prices, one bar or a batch of bars - the moments are updated, not recalculated
+        if self.statistics is None:
+            self.statistics = StreamingReturns(len(self.stocks))
+        self.statistics.update(prices)
+        return self.statistics.snapshot()
+
     def show_plot(self, stock_data):
         plt.hist(stock_data, bins=300)
         stock_variance = stock_data.var()
@@ -57,3 +61,9 @@ if __name__ == '__main__':
     log_daily_returns = stock_return.calculate_returns(stock)
     stock_return.show_plot(log_daily_returns)
 
+    # The same moments from the prices fed in batches, as they would arrive live
+    for bars in np.array_split(stock.dropna().values, 10):
+        snapshot = stock_return.update_statistics(bars)
+    print('Mean: %s, std: %s, skewness: %s, kurtosis: %s' %
+          (snapshot['mean'], snapshot['std'], snapshot['skewness'], snapshot['kurtosis']))
+
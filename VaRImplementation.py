@@ -1,7 +1,9 @@
 import numpy as np
-import pandas as pd
-import yfinance as yf
+import market_data
 from scipy.stats import norm
+from functools import partial
+from running_statistics import simulate_until
+from parallel_simulation import run_blocks
 
 stocks = ['NVDA']
 
@@ -9,13 +11,89 @@ start_date = '2018-01-01'
 end_date = '2025-01-01'
 
 def download_data():
-    stock_data = {}
-
-    for stock in stocks:
-        ticker = yf.Ticker(stock)
-        stock_data[stock] = ticker.history(start=start_date, end=end_date)['Close']
-
-    return pd.DataFrame(stock_data)
+    # Close prices from the local cache, only the missing date ranges are downloaded
+    return market_data.download_data(stocks, start_date, end_date)
+
+def simulate_position_values(position, mu, sigma, n, paths, rng):
+    """
+        Value of the position in n days for the given number of simulated paths
+    """
+    rand = rng.standard_normal(paths)
+    return position * np.exp(n * (mu - 0.5 * sigma ** 2) + sigma * np.sqrt(n) * rand)
+
+def simulate_asset_returns(mu, cholesky, n, paths, rng, dtype=np.float64):
+    """
+        Correlated n day simple returns of the assets for the given number of paths
+    """
+    shocks = rng.standard_normal((paths, len(mu)), dtype=dtype) @ cholesky.T.astype(dtype)
+    variance = np.sum(cholesky ** 2, axis=1)
+    shocks *= np.sqrt(n)
+    shocks += (n * (mu - 0.5 * variance)).astype(dtype)
+    return np.expm1(shocks, out=shocks)
+
+def portfolio_pnl(returns, positions, log_returns=True):
+    """
+        Profit and loss of every book for every historical scenario
+
+        returns is a (scenarios x assets) matrix, positions the value held in every asset -
+        one vector or a (books x assets) matrix. Gives a (scenarios,) or (scenarios x books) array.
+    """
+    returns = np.asarray(returns, dtype=float)
+    if log_returns:
+        returns = np.expm1(returns)
+    return returns @ np.asarray(positions, dtype=float).T
+
+def _tail_risk(samples, confidence):
+    # VaR (same interpolation as np.percentile) and expected shortfall along the last axis
+    # with one partial selection for all the confidence levels instead of a full sort
+    confidence = np.atleast_1d(np.asarray(confidence, dtype=float))
+    size = samples.shape[-1]
+    h = (size - 1) * (1 - confidence)
+    lower = np.floor(h).astype(int)
+    upper = np.minimum(lower + 1, size - 1)
+    # number of scenarios in the tail beyond the VaR
+    tail = np.maximum(np.ceil((1 - confidence) * size).astype(int), 1)
+
+    partitioned = np.partition(samples, np.unique(np.concatenate([lower, upper, tail - 1])), axis=-1)
+    percentile = partitioned[..., lower] + (h - lower) * (partitioned[..., upper] - partitioned[..., lower])
+    # the first tail scenarios are the smallest ones, in any order
+    tail_sums = np.cumsum(partitioned[..., :tail.max()], axis=-1)[..., tail - 1]
+    return np.moveaxis(-percentile, -1, 0), np.moveaxis(-tail_sums / tail, -1, 0)
+
+def historical_var(pnl, confidence):
+    """
+        Historical-simulation VaR and expected shortfall (as positive losses) of the P&L scenarios
+
+        pnl has one column per book; confidence may be an array of levels - the results
+        then have one row per confidence level
+    """
+    pnl = np.asarray(pnl, dtype=float)
+    var, expected_shortfall = _tail_risk(pnl.T, confidence)
+    if np.ndim(confidence) == 0:
+        var, expected_shortfall = var[0], expected_shortfall[0]
+    return var, expected_shortfall
+
+def rolling_historical_var(pnl, window, confidence, chunk_size=1000000):
+    """
+        Historical-simulation VaR and expected shortfall over the trailing window of every date
+
+        The first window-1 dates are NaN. The windows are views of the P&L array and are
+        partitioned in blocks of dates so at most about chunk_size values are copied at once.
+    """
+    pnl = np.asarray(pnl, dtype=float)
+    windows = np.lib.stride_tricks.sliding_window_view(pnl, window, axis=0)
+    levels = np.atleast_1d(confidence)
+
+    var = np.full((len(levels),) + pnl.shape, np.nan)
+    expected_shortfall = np.full_like(var, np.nan)
+    step = max(chunk_size // (windows[0].size or 1), 1)
+    for start in range(0, len(windows), step):
+        dates = slice(start + window - 1, start + window - 1 + step)
+        var[:, dates], expected_shortfall[:, dates] = _tail_risk(windows[start:start + step], levels)
+
+    if np.ndim(confidence) == 0:
+        var, expected_shortfall = var[0], expected_shortfall[0]
+    return var, expected_shortfall
 
 class ValueAtRiskImplementation:
 
@@ -41,20 +119,100 @@ class ValueAtRiskImplementation:
         var = position * (mu * n - sigma * np.sqrt(n) * norm.ppf(1-confidence))
         return var
 
-    def montecarlo_simulation_var(self, position, confidence, mu, sigma, n, iterations):
+    def montecarlo_simulation_var(self, position, confidence, mu, sigma, n, iterations, seed=None, workers=1):
         """
             VaR Calculation with Montecarlo Simulation
         """
-        rand = np.random.normal(0, 1, [1, self.iterations])
+        # Equation for the S(t) stock price - blocks of paths are simulated by the workers
+        stock_price = np.concatenate(run_blocks(partial(simulate_position_values, position, mu, sigma, n),
+                                                iterations, seed, workers))
 
-        # Equation for the S(t) stock price
-        stock_price = self.position * np.exp(self.n * (self.mu - 0.5 * self.sigma ** 2) + self.sigma * np.sqrt(self.n) * rand)
+        # The percentile is found by partial selection, no need to sort the prices
+        var, _ = historical_var(stock_price - position, confidence)
+        return var
 
-        # Sort the stock prices to determine the percentile
-        stock_price = np.sort(stock_price)
-        percentile = np.percentile(stock_price, (1 - self.confidence) * 100)
+    def montecarlo_simulation_var_streaming(self, position, confidence, mu, sigma, n, iterations,
+                                            target_error=None, target_width=None, chunk_size=100000, seed=None,
+                                            interval_confidence=0.95):
+        """
+            Memory-bounded Monte-Carlo VaR - at most iterations paths in equal chunks of at most chunk_size
 
-        return self.position - percentile
+            Every chunk gives its own VaR estimate (batch means), the running mean and
+            standard error of these estimates decide when to stop - target_width is the
+            width of the interval_confidence interval of the VaR (not the VaR confidence).
+            Returns the VaR, its standard error and the number of paths actually used
+        """
+        rng = np.random.default_rng(seed)
+        # iterations is split into equal chunks (at least 2 for a standard error), so every
+        # batch estimate is equally noisy - the remainder of fewer paths than chunks is not drawn
+        chunks = max(-(-iterations // chunk_size), 2)
+        chunk_size = max(iterations // chunks, 1)
+
+        def chunk_var(paths):
+            rand = rng.standard_normal(paths)
+            stock_price = position * np.exp(n * (mu - 0.5 * sigma ** 2) + sigma * np.sqrt(n) * rand)
+            return [position - np.percentile(stock_price, (1 - confidence) * 100)]
+
+        moments, paths = simulate_until(chunk_var, chunk_size, min(chunks * chunk_size, iterations),
+                                        target_error, target_width, interval_confidence)
+        return moments.mean, moments.standard_error(), paths
+
+class MultiAssetValueAtRisk:
+    """
+        Monte-Carlo VaR of portfolios of correlated assets (multivariate normal log returns)
+
+        The Cholesky factor of the covariance is calculated once, and one set of simulated
+        scenarios is reused for every portfolio and confidence level.
+    """
+
+    def __init__(self, mu, covariance, n=1):
+        # daily mean log returns and covariance of the assets, VaR for n days
+        self.mu = np.asarray(mu, dtype=float)
+        self.covariance = np.asarray(covariance, dtype=float)
+        self.n = n
+        self.scenarios = None
+        try:
+            self.cholesky = np.linalg.cholesky(self.covariance)
+        except np.linalg.LinAlgError:
+            # positive semi-definite covariance (e.g. more assets than observations)
+            eigenvalues, eigenvectors = np.linalg.eigh(self.covariance)
+            self.cholesky = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+
+    @classmethod
+    def from_returns(cls, returns, n=1):
+        return cls(np.mean(returns, axis=0), np.cov(returns, rowvar=False), n)
+
+    def simulate(self, iterations, seed=None, workers=1, dtype=np.float64):
+        # (iterations x assets) simple returns, kept for all the following var() calls
+        self.scenarios = np.concatenate(run_blocks(partial(simulate_asset_returns, self.mu, self.cholesky, self.n,
+                                                           dtype=dtype), iterations, seed, workers))
+        return self.scenarios
+
+    def var(self, positions, confidence, chunk_size=20000000):
+        """
+            VaR and expected shortfall of every portfolio (row of positions) at every confidence level
+
+            The P&L of blocks of portfolios is calculated at a time, about chunk_size values.
+        """
+        if self.scenarios is None:
+            raise ValueError("No scenarios, call simulate first")
+        positions = np.asarray(positions, dtype=self.scenarios.dtype)
+        books = np.atleast_2d(positions)
+        levels = np.atleast_1d(confidence)
+
+        var = np.empty((len(levels), len(books)))
+        expected_shortfall = np.empty_like(var)
+        step = max(chunk_size // len(self.scenarios), 1)
+        for start in range(0, len(books), step):
+            # (books x scenarios) so every portfolio is one contiguous row
+            pnl = books[start:start + step] @ self.scenarios.T
+            var[:, start:start + step], expected_shortfall[:, start:start + step] = _tail_risk(pnl, levels)
+
+        if positions.ndim == 1:
+            var, expected_shortfall = var[:, 0], expected_shortfall[:, 0]
+        if np.ndim(confidence) == 0:
+            var, expected_shortfall = var[0], expected_shortfall[0]
+        return var, expected_shortfall
 
 if __name__ == "__main__":
 
@@ -83,3 +241,13 @@ if __name__ == "__main__":
 
     print('Value at risk for NVDA at 95 percent confidence: %0.2f' % var_impl.calculate_var_ndays(position, confidence, mu, sigma, n))
     print('Value at risk for NVDA with Monte-Carlo simulation: %0.2f' % var_impl.montecarlo_simulation_var(position, confidence, mu, sigma, n, iterations))
+    print('Value at risk for NVDA with streaming Monte-Carlo: %0.2f +/- %0.2f (%d paths)' %
+          var_impl.montecarlo_simulation_var_streaming(position, confidence, mu, sigma, n, 100000000, target_error=50))
+
+    # Historical simulation - the position in NVDA at several confidence levels
+    pnl = portfolio_pnl(stock_data[['returns']], [position])
+    var, expected_shortfall = historical_var(pnl, [0.95, 0.99])
+    print('Historical VaR for NVDA at 95 and 99 percent confidence: %0.2f %0.2f' % tuple(var))
+    print('Expected shortfall for NVDA at 95 and 99 percent confidence: %0.2f %0.2f' % tuple(expected_shortfall))
+    var, _ = rolling_historical_var(pnl, 252, confidence)
+    print('One year rolling historical VaR for NVDA, last date: %0.2f' % var[-1])
@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from BlackScholesImplementation import option_prices, option_greeks
+import BlackScholesMonteCarlo
+import OptionPricingImplemenation
+from StockPriceMonteCarlo import StockPriceMonteCarlo
+from BondPricing import BondPricing
+from InterestRateModelling import InterestRateModelling
+from MarkowitzModel import Markowitz, NUM_TRADING_DAYS
+from VaRImplementation import ValueAtRiskImplementation, historical_var, portfolio_pnl, MultiAssetValueAtRisk
+
+# Results of a reference run, compared against by default
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks_baseline.json')
+# A benchmark regresses when it is this much slower (or uses this much more memory) than the baseline
+TOLERANCE = 0.25
+# ... and by more than these absolute amounts, so the noise of tiny problems is not flagged
+MIN_DIFFERENCE = {'seconds': 0.001, 'peak_memory_mb': 0.1}
+# Best of this many timed runs
+REPEAT = 3
+
+
+def synthetic_returns(days, assets, rng):
+    # correlated daily log returns (one common factor) with dates, instead of downloaded prices
+    market = rng.normal(0.0004, 0.01, (days, 1))
+    returns = 0.0002 + rng.uniform(0.5, 1.5, assets) * market + rng.normal(0, 0.015, (days, assets))
+    return pd.DataFrame(returns, index=pd.bdate_range('2010-01-01', periods=days),
+                        columns=['S%d' % i for i in range(assets)])
+
+
+# Every benchmark builds its synthetic inputs for a problem size and returns the function
+# to be timed and the number of items (contracts, paths, portfolios ...) it processes
+
+def black_scholes_closed_form(size, rng):
+    S, sigma = rng.uniform(50, 150, size), rng.uniform(0.1, 0.5, size)
+    return lambda: option_prices(S, 100, 1, 0.05, sigma), size
+
+
+def black_scholes_greeks(size, rng):
+    S, sigma = rng.uniform(50, 150, size), rng.uniform(0.1, 0.5, size)
+    return lambda: option_greeks(S, 100, 1, 0.05, sigma), size
+
+
+def monte_carlo_option(size, rng):
+    pricing = BlackScholesMonteCarlo.OptionPricing(100, 100, 1, 0.05, 0.2, size)
+    return lambda: pricing.call_option_simulation(seed=42), size
+
+
+def monte_carlo_option_variance_reduced(size, rng):
+    pricing = OptionPricingImplemenation.OptionPricing(100, 100, 1, 0.05, 0.2, size)
+    return lambda: pricing.call_option_simulation_vr(seed=42), size
+
+
+def stock_price_monte_carlo(size, rng):
+    simulation = StockPriceMonteCarlo(850, 0.0002, 0.01)
+    return lambda: simulation.simulate(size, seed=42), size
+
+
+def bond_monte_carlo(size, rng):
+    bond = BondPricing(1000, 0.1, 0.3, 0.3, 0.03)
+    return lambda: bond.monte_carlo_simulation(1000, 0.1, 0.3, 0.3, 0.03, seed=42, simulations=size), size
+
+
+def bond_term_structure(size, rng):
+    bond = BondPricing(1000, 0.1, 0.3, 0.3, 0.03)
+    maturities = np.linspace(0, 30, size)
+    return lambda: bond.term_structure(maturities), size
+
+
+def vasicek_paths(size, rng):
+    model = InterestRateModelling(0, 0.1, 0.3, 0.3, 0.03)
+    return lambda: model.vasicek_paths(0.1, 0.3, 0.3, 0.03, T=1, N=1000, paths=size, seed=42), size
+
+
+def markowitz_generate_portfolios(size, rng):
+    returns = synthetic_returns(NUM_TRADING_DAYS * 5, 10, rng)
+    markowitz = Markowitz(list(returns.columns), None, None)
+    return lambda: markowitz.generate_portfolios(returns, size, seed=42), size
+
+
+def markowitz_optimize_portfolio(size, rng):
+    returns = synthetic_returns(NUM_TRADING_DAYS * 5, size, rng)
+    weights = np.full((1, size), 1.0 / size)
+    # a new Markowitz every run - it caches the fitted covariance of the returns
+    return lambda: Markowitz(list(returns.columns), None, None).optimize_portfolio(weights, returns), size
+
+
+def var_parametric(size, rng):
+    var = ValueAtRiskImplementation(1e6, 0.0005, 0.02, 0.99, 5, 0)
+    positions = rng.uniform(1e5, 1e7, size)
+    return lambda: var.calculate_var_ndays(positions, 0.99, 0.0005, 0.02, 5), size
+
+
+def var_monte_carlo(size, rng):
+    var = ValueAtRiskImplementation(1e6, 0.0005, 0.02, 0.99, 5, size)
+    return lambda: var.montecarlo_simulation_var(1e6, 0.99, 0.0005, 0.02, 5, size, seed=42), size
+
+
+def var_historical(size, rng):
+    returns = synthetic_returns(NUM_TRADING_DAYS * 10, 50, rng)
+    positions = rng.uniform(0, 1e6, (size, 50))
+    return lambda: historical_var(portfolio_pnl(returns, positions), [0.95, 0.99]), size
+
+
+def var_multi_asset_monte_carlo(size, rng):
+    var = MultiAssetValueAtRisk.from_returns(synthetic_returns(NUM_TRADING_DAYS * 5, 20, rng))
+    positions = rng.uniform(0, 1e6, (10, 20))
+
+    def run():
+        var.simulate(size, seed=42)
+        return var.var(positions, [0.95, 0.99])
+    return run, size
+
+
+# name, benchmark and the problem sizes it runs at
+BENCHMARKS = [
+    ('black_scholes_closed_form', black_scholes_closed_form, (1000, 100000, 1000000)),
+    ('black_scholes_greeks', black_scholes_greeks, (1000, 100000, 1000000)),
+    ('monte_carlo_option', monte_carlo_option, (10000, 100000, 1000000)),
+    ('monte_carlo_option_variance_reduced', monte_carlo_option_variance_reduced, (10000, 100000, 1000000)),
+    ('stock_price_monte_carlo', stock_price_monte_carlo, (100, 1000, 10000)),
+    ('bond_monte_carlo', bond_monte_carlo, (100, 1000, 10000)),
+    ('bond_term_structure', bond_term_structure, (100, 10000, 1000000)),
+    ('vasicek_paths', vasicek_paths, (10, 100, 1000)),
+    ('markowitz_generate_portfolios', markowitz_generate_portfolios, (1000, 10000, 100000)),
+    ('markowitz_optimize_portfolio', markowitz_optimize_portfolio, (10, 50, 200)),
+    ('var_parametric', var_parametric, (1000, 100000, 1000000)),
+    ('var_monte_carlo', var_monte_carlo, (10000, 100000, 1000000)),
+    ('var_historical', var_historical, (10, 100, 1000)),
+    ('var_multi_asset_monte_carlo', var_multi_asset_monte_carlo, (10000, 100000, 1000000)),
+]
+
+
+def measure(function, items, repeat=REPEAT):
+    """
+        Best wall time of repeat runs, the throughput (items per second) and the peak
+        memory allocated by one extra run (traced separately, tracing slows everything down)
+    """
+    # the pricers print their results - keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    best = min(seconds)
+    return {
+        'seconds': best,
+        'throughput': items / best if best > 0 else float('inf'),
+        'peak_memory_mb': peak / 2 ** 20,
+    }
+
+
+def run(names=None, levels=3, repeat=REPEAT, seed=42):
+    """
+        Runs the benchmarks (all of them, or the given names) at their first levels problem sizes
+    """
+    results = {}
+    for name, benchmark, sizes in BENCHMARKS:
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for size in sizes[:levels]:
+            function, items = benchmark(size, np.random.default_rng(seed))
+            results[name][str(size)] = measure(function, items, repeat)
+            print('%-40s %10d %12.6fs %14.1f/s %10.2f MB' % ((name, size) + tuple(
+                results[name][str(size)][key] for key in ('seconds', 'throughput', 'peak_memory_mb'))))
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+        (name, size, metric, baseline value, new value) of every benchmark that got slower or
+        allocates more memory than the baseline by more than the tolerance
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, measured in sizes.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference is None:
+                continue
+            for metric in ('seconds', 'peak_memory_mb'):
+                if measured[metric] > reference[metric] * (1 + tolerance) and \
+                        measured[metric] - reference[metric] > MIN_DIFFERENCE[metric]:
+                    regressions.append((name, size, metric, reference[metric], measured[metric]))
+    return regressions
+
+
+def save(results, path=BASELINE):
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                   'results': results}, f, indent=2)
+
+
+def load(path=BASELINE):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Wall time, throughput and peak memory of the pricers')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (all by default)')
+    parser.add_argument('--levels', type=int, default=3, help='number of problem sizes per benchmark')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file of a reference run')
+    parser.add_argument('--save', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.names, args.levels, args.repeat)
+
+    if args.save:
+        save(results, args.baseline)
+        print('Baseline saved to %s' % args.baseline)
+    elif os.path.exists(args.baseline):
+        regressions = compare(results, load(args.baseline), args.tolerance)
+        for name, size, metric, reference, measured in regressions:
+            print('REGRESSION %s (size %s): %s %.6g -> %.6g' % (name, size, metric, reference, measured))
+        if regressions:
+            sys.exit(1)
+        print('No regressions against %s' % args.baseline)
+    else:
+        print('No baseline found at %s, nothing compared (store one with --save)' % args.baseline)
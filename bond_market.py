@@ -1,3 +1,5 @@
+import numpy as np
+
 class ZeroCouponBond:
 
     def __init__(self, principal, maturity, interest_rate):
@@ -41,6 +43,58 @@ class CouponBond:
 
         return price
 
+class BondBook:
+    """
+        Prices a whole book of fixed coupon bonds in one vectorized call
+
+        Every argument is a scalar or an array with one item per bond. Rates are in percent,
+        maturities in years (need not be whole coupon periods) and the yield is compounded
+        at the coupon frequency. The coupons are discounted with the closed form of the
+        annuity, and the discount factor is calculated once for every distinct yield
+        per period.
+    """
+
+    def __init__(self, principal, rate, maturity, interest_rate, frequency=1):
+        self.principal, self.rate, self.maturity, self.interest_rate, self.frequency = np.broadcast_arrays(
+            np.asarray(principal, dtype=float), np.asarray(rate, dtype=float) / 100,
+            np.asarray(maturity, dtype=float), np.asarray(interest_rate, dtype=float) / 100,
+            np.asarray(frequency, dtype=float))
+
+    def _schedule(self):
+        # coupon periods until maturity, the number of coupons left and the periods until the next one
+        periods = self.maturity * self.frequency
+        coupons = np.maximum(np.ceil(periods - 1e-9), 0)
+        return periods, coupons, periods - (coupons - 1)
+
+    def coupon(self):
+        return self.principal * self.rate / self.frequency
+
+    def accrued_interest(self):
+        _, coupons, next_coupon = self._schedule()
+        return np.where(coupons > 0, self.coupon() * (1 - next_coupon), 0.0)
+
+    def dirty_price(self):
+        periods, coupons, next_coupon = self._schedule()
+
+        # log of the per-period discount factor, once for every distinct per-period yield
+        per_period_rate = self.interest_rate / self.frequency
+        rates, index = np.unique(per_period_rate, return_inverse=True)
+        log_growth = np.log1p(rates)[index].reshape(per_period_rate.shape)
+
+        # sum of the discount factors of the remaining coupons: (1 - (1+i)^-N) / i, N if i = 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity = np.where(per_period_rate == 0, coupons,
+                               -np.expm1(-coupons * log_growth) / per_period_rate)
+        annuity *= np.exp((1 - next_coupon) * log_growth)
+
+        return self.coupon() * annuity + self.principal * np.exp(-periods * log_growth)
+
+    def clean_price(self):
+        return self.dirty_price() - self.accrued_interest()
+
+    def calculate_price(self):
+        return self.dirty_price()
+
 if __name__ == '__main__':
 
     bond = ZeroCouponBond(100, 2, 4)
@@ -48,3 +102,10 @@ if __name__ == '__main__':
 
     bond = CouponBond(100, 10, 3, 4)
     print("Price of the coupon bond: %.2f" % bond.calculate_price())
+
+    # A book of bonds with different maturities, coupons and semi-annual payments
+    rng = np.random.default_rng(42)
+    size = 100000
+    book = BondBook(100, rng.uniform(0, 10, size), rng.uniform(0.1, 30, size),
+                    rng.choice([2.0, 3.0, 4.0, 5.0], size), frequency=rng.choice([1, 2, 4], size))
+    print("Average clean price of the bond book: %.2f" % book.clean_price().mean())
@@ -0,0 +1,190 @@
+import copy
+import numpy as np
+
+
+class CovarianceEstimator:
+    """
+        Covariance matrix that does not have to be stored as a dense n x n matrix
+
+        Every estimator can multiply the covariance with weight vectors (dot), give
+        sub-blocks of the matrix (submatrix) and portfolio variances without forming
+        the full matrix - covariance() builds the dense matrix only when asked for.
+    """
+    scale = 1.0
+
+    def scaled(self, factor):
+        # e.g. scaled(NUM_TRADING_DAYS) for annual covariance from daily returns
+        estimator = copy.copy(self)
+        estimator.scale = self.scale * factor
+        return estimator
+
+    def dot(self, weights):
+        # Cov * w for a weight vector or for the columns of an (assets x k) matrix
+        return self.scale * self._dot(np.asarray(weights, dtype=float))
+
+    def submatrix(self, rows, columns):
+        return self.scale * self._submatrix(np.asarray(rows, dtype=int), np.asarray(columns, dtype=int))
+
+    def solve(self, assets, right_hand_side):
+        # Cov[assets, assets]^-1 * b
+        return self._solve(np.asarray(assets, dtype=int), np.asarray(right_hand_side, dtype=float)) / self.scale
+
+    def _solve(self, assets, right_hand_side):
+        return np.linalg.solve(self._submatrix(assets, assets), right_hand_side)
+
+    def covariance(self):
+        assets = np.arange(self.assets)
+        return self.submatrix(assets, assets)
+
+    def portfolio_variance(self, weights):
+        # w^T * Cov * w for a weight vector or for every row of a (portfolios x assets) matrix
+        weights = np.asarray(weights, dtype=float)
+        return np.sum(weights * self.dot(weights.T).T, axis=-1)
+
+
+class DenseCovariance(CovarianceEstimator):
+    """
+        Wraps an already calculated covariance matrix
+    """
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=float)
+        self.assets = self.matrix.shape[0]
+
+    def _dot(self, weights):
+        return self.matrix @ weights
+
+    def _submatrix(self, rows, columns):
+        return self.matrix[np.ix_(rows, columns)]
+
+
+class _GramCovariance(CovarianceEstimator):
+    """
+        Cov = (1-shrinkage) * Z^T Z + shrinkage * target * I for a (observations x assets)
+        matrix Z of scaled, demeaned returns - O(n*T) memory instead of O(n^2)
+    """
+    shrinkage = 0.0
+    target = 0.0
+
+    def _set(self, scaled_returns):
+        self.scaled_returns = scaled_returns
+        self.assets = scaled_returns.shape[1]
+        return self
+
+    def _dot(self, weights):
+        Z = self.scaled_returns
+        return (1 - self.shrinkage) * (Z.T @ (Z @ weights)) + self.shrinkage * self.target * weights
+
+    def _submatrix(self, rows, columns):
+        Z = self.scaled_returns
+        identity = rows[:, np.newaxis] == columns[np.newaxis, :]
+        return (1 - self.shrinkage) * (Z[:, rows].T @ Z[:, columns]) + self.shrinkage * self.target * identity
+
+
+class SampleCovariance(_GramCovariance):
+    """
+        Sample covariance - the same as returns.cov()
+    """
+
+    def fit(self, returns):
+        X = np.asarray(returns, dtype=float)
+        X = X - X.mean(axis=0)
+        return self._set(X / np.sqrt(X.shape[0] - 1))
+
+
+class LedoitWolfCovariance(_GramCovariance):
+    """
+        Ledoit-Wolf shrinkage of the sample covariance towards a scaled identity matrix
+
+        The optimal shrinkage intensity is calculated from the (T x T) Gram matrix of the
+        returns, so it is cheap when there are more assets than observations.
+    """
+
+    def fit(self, returns):
+        X = np.asarray(returns, dtype=float)
+        X = X - X.mean(axis=0)
+        observations, assets = X.shape
+
+        gram = X @ X.T
+        # trace and squared Frobenius norm of the (biased) sample covariance S = X^T X / T
+        trace = np.trace(gram) / observations
+        squared_norm = np.sum(gram ** 2) / observations ** 2
+        target = trace / assets
+
+        # distance of S from the target and the estimation error of S
+        delta = (squared_norm - assets * target ** 2) / assets
+        beta = (np.sum(np.sum(X ** 2, axis=1) ** 2) / observations - squared_norm) / (assets * observations)
+
+        self.target = target
+        self.shrinkage = 0.0 if delta == 0 else min(beta, delta) / delta
+        return self._set(X / np.sqrt(observations))
+
+
+class EWMACovariance(_GramCovariance):
+    """
+        Exponentially weighted covariance - the weight of an observation halves every halflife days
+    """
+
+    def __init__(self, halflife=60):
+        self.halflife = halflife
+
+    def fit(self, returns):
+        X = np.asarray(returns, dtype=float)
+        ages = np.arange(X.shape[0])[::-1]
+        weights = 0.5 ** (ages / self.halflife)
+        weights /= weights.sum()
+
+        X = X - weights @ X
+        return self._set(np.sqrt(weights)[:, np.newaxis] * X)
+
+
+class FactorCovariance(CovarianceEstimator):
+    """
+        Statistical factor model: Cov = B B^T + diag(D) with the k principal components as factors
+
+        Only the (assets x k) loadings and the specific variances are kept - O(n*k) memory,
+        Cov * w = B (B^T w) + D * w costs O(n*k) and the linear systems are solved with the
+        Woodbury identity (a k x k system instead of an n x n one).
+    """
+
+    def __init__(self, factors=10):
+        self.factors = factors
+
+    def fit(self, returns):
+        X = np.asarray(returns, dtype=float)
+        X = X - X.mean(axis=0)
+        observations, self.assets = X.shape
+
+        _, singular_values, components = np.linalg.svd(X, full_matrices=False)
+        k = min(self.factors, len(singular_values))
+        self.loadings = components[:k].T * singular_values[:k] / np.sqrt(observations - 1)
+
+        total_variance = np.sum(X ** 2, axis=0) / (observations - 1)
+        # what the factors do not explain is specific to the asset
+        self.specific_variance = np.maximum(total_variance - np.sum(self.loadings ** 2, axis=1),
+                                            1e-12 * total_variance.mean())
+        return self
+
+    def _dot(self, weights):
+        specific = self.specific_variance if weights.ndim == 1 else self.specific_variance[:, np.newaxis]
+        return self.loadings @ (self.loadings.T @ weights) + specific * weights
+
+    def _submatrix(self, rows, columns):
+        identity = rows[:, np.newaxis] == columns[np.newaxis, :]
+        return self.loadings[rows] @ self.loadings[columns].T + identity * self.specific_variance[rows][:, np.newaxis]
+
+    def _solve(self, assets, right_hand_side):
+        # no more assets than factors: the dense block is as small as the Woodbury core, and
+        # it stays accurate when the factors explain (almost) all the variance and D is ~0
+        if len(assets) <= self.loadings.shape[1]:
+            return super()._solve(assets, right_hand_side)
+        # (D + B B^T)^-1 = D^-1 - D^-1 B (I + B^T D^-1 B)^-1 B^T D^-1
+        loadings = self.loadings[assets]
+        inverse_specific = 1.0 / self.specific_variance[assets]
+        if right_hand_side.ndim == 1:
+            scaled = inverse_specific * right_hand_side
+        else:
+            scaled = inverse_specific[:, np.newaxis] * right_hand_side
+        scaled_loadings = inverse_specific[:, np.newaxis] * loadings
+        core = np.eye(loadings.shape[1]) + loadings.T @ scaled_loadings
+        return scaled - scaled_loadings @ np.linalg.solve(core, loadings.T @ scaled)
@@ -0,0 +1,138 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Close prices are cached here, one memory-mapped NumPy file per ticker
+CACHE_DIR = os.environ.get('FRM_QUANT_CACHE', os.path.join(os.path.expanduser('~'), '.frm_quant_cache'))
+# Directory of <TICKER>.csv files - when set everything runs offline against these fixtures
+FIXTURES_DIR = os.environ.get('FRM_QUANT_FIXTURES')
+
+RECORD = np.dtype([('date', 'datetime64[D]'), ('close', 'f8')])
+
+
+class YahooFinanceProvider:
+    """
+        Downloads the close price history with yfinance
+
+        A range without prices (weekends, holidays) gives no records, a failed download
+        raises the yfinance (or network) exception.
+    """
+
+    def history(self, stock, start_date, end_date):
+        # yfinance is only needed when something really has to be downloaded
+        import yfinance as yf
+        from yfinance.exceptions import YFPricesMissingError
+
+        try:
+            close = yf.Ticker(stock).history(start=str(start_date), end=str(end_date), raise_errors=True)['Close']
+        except YFPricesMissingError:
+            return _records([], [])
+        # the dates of the exchange's own time zone - converting to UTC first moves the
+        # bars of the exchanges east of UTC (e.g. Tokyo) one day back
+        return _records(close.index.tz_localize(None).values.astype('datetime64[D]'), close.values)
+
+
+class LocalFixtureProvider:
+    """
+        Serves the close prices from local <TICKER>.csv files with Date and Close columns
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def history(self, stock, start_date, end_date):
+        data = pd.read_csv(os.path.join(self.directory, '%s.csv' % stock))
+        dates = pd.to_datetime(data['Date'].astype(str).str[:10]).values.astype('datetime64[D]')
+        inside = (dates >= np.datetime64(start_date, 'D')) & (dates < np.datetime64(end_date, 'D'))
+        return _records(dates[inside], data['Close'].values[inside])
+
+
+def _records(dates, close):
+    records = np.empty(len(dates), dtype=RECORD)
+    records['date'] = dates
+    records['close'] = close
+    return records
+
+
+class MarketDataCache:
+    """
+        Local store of close prices - only the date ranges not in the cache yet are fetched
+
+        Every ticker has a <TICKER>.npy file of (date, close) records, loaded memory-mapped,
+        and a <TICKER>.json file with the [start, end) range the provider answered, even
+        without records (so weekends and holidays are not fetched again and again). The
+        provider raises when a download fails - nothing is stored then.
+    """
+
+    def __init__(self, provider=None, cache_dir=CACHE_DIR):
+        if provider is None:
+            provider = LocalFixtureProvider(FIXTURES_DIR) if FIXTURES_DIR else YahooFinanceProvider()
+        self.provider = provider
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, stock, extension):
+        return os.path.join(self.cache_dir, '%s.%s' % (stock, extension))
+
+    def _load(self, stock):
+        try:
+            with open(self._path(stock, 'json')) as f:
+                coverage = json.load(f)
+            records = np.load(self._path(stock, 'npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None, None
+        return records, (np.datetime64(coverage['start'], 'D'), np.datetime64(coverage['end'], 'D'))
+
+    def _store(self, stock, records, start, end):
+        # write to temporary files first so an interrupted run never leaves a broken cache
+        path = self._path(stock, 'npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, records)
+        os.replace(path + '.tmp', path)
+
+        path = self._path(stock, 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'start': str(start), 'end': str(end)}, f)
+        os.replace(path + '.tmp', path)
+
+    def close_prices(self, stock, start_date, end_date):
+        start, end = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+        records, coverage = self._load(stock)
+
+        if coverage is None:
+            missing = [(start, end)]
+        else:
+            # the cached range only ever grows at its ends so it stays one contiguous range
+            missing = [(start, coverage[0])] if start < coverage[0] else []
+            if end > coverage[1]:
+                missing.append((coverage[1], end))
+
+        if missing:
+            # a failed download raises here, before anything is marked as covered
+            fetched = [self.provider.history(stock, s, e) for s, e in missing]
+            if records is not None:
+                fetched.append(np.array(records))
+            records = np.concatenate(fetched)
+            records = records[np.unique(records['date'], return_index=True)[1]]
+
+            # the missing ranges touch the cached range, so the covered range stays contiguous
+            new_start = start if coverage is None else min(start, coverage[0])
+            new_end = end if coverage is None else max(end, coverage[1])
+            # days after today cannot have data yet, they are fetched again next time
+            new_end = max(min(new_end, np.datetime64('today', 'D')), new_start)
+            self._store(stock, records, new_start, new_end)
+
+        inside = (records['date'] >= start) & (records['date'] < end)
+        return pd.Series(records['close'][inside], index=pd.DatetimeIndex(records['date'][inside], name='Date'),
+                         name=stock)
+
+    def download_data(self, stocks, start_date, end_date):
+        return pd.DataFrame({stock: self.close_prices(stock, start_date, end_date) for stock in stocks})
+
+
+def download_data(stocks, start_date, end_date, cache=None):
+    """
+        Close prices of the stocks (one column per ticker) served from the local cache
+    """
+    return (cache or MarketDataCache()).download_data(stocks, start_date, end_date)
@@ -0,0 +1,47 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+# Number of paths simulated by one task - fixed so the random streams do not depend on the worker count
+BLOCK_SIZE = 100000
+
+
+def split_paths(total, block_size=BLOCK_SIZE):
+    """
+        Sizes of the blocks the total number of paths is split into
+    """
+    blocks = [block_size] * (total // block_size)
+    if total % block_size:
+        blocks.append(total % block_size)
+    return blocks
+
+
+def _run_block(task, n, seed_sequence):
+    return task(n, np.random.default_rng(seed_sequence))
+
+
+def run_blocks(task, total, seed=None, workers=1, block_size=BLOCK_SIZE, executor='thread'):
+    """
+        Runs task(n, rng) over blocks of paths on a pool of workers
+
+        Every block gets its own independent random stream spawned from SeedSequence(seed),
+        and the results are returned in block order - so for a given seed the answer is the
+        same for any number of workers. Threads are enough for NumPy kernels (random draws
+        and ufuncs release the GIL), executor='process' needs a picklable (module level) task.
+    """
+    blocks = split_paths(total, block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+
+    if workers == 1 or len(blocks) == 1:
+        return [_run_block(task, n, s) for n, s in zip(blocks, seeds)]
+
+    pool = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool(max_workers=workers) as p:
+        return list(p.map(_run_block, repeat(task), blocks, seeds))
+
+
+def parallel_mean(task, total, seed=None, workers=1, block_size=BLOCK_SIZE, executor='thread'):
+    """
+        Mean over all the paths when task(n, rng) returns the sum of its n values
+    """
+    return np.sum(run_blocks(task, total, seed, workers, block_size, executor), axis=0) / float(total)
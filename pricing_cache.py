@@ -0,0 +1,147 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from BlackScholesImplementation import option_prices
+from BondPricing import BondPricing
+from bond_market import CouponBond
+
+# Most results kept in the cache, the least recently used ones are evicted first
+MAX_SIZE = 100000
+# Inputs are rounded to this many decimals - nearly identical requests share one entry
+DECIMALS = 6
+
+
+class PricingCache:
+    """
+        Thread-safe LRU cache of prices keyed on the quantized inputs
+
+        Numeric inputs are rounded to the given number of decimals and the price is
+        calculated from the rounded inputs, so an entry never depends on which of the
+        nearly identical requests came first. Entries older than ttl seconds (if given)
+        are recalculated. The size is bounded by maxsize.
+    """
+
+    def __init__(self, maxsize=MAX_SIZE, ttl=None, decimals=DECIMALS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+        self._scale = 10.0 ** decimals
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def quantize(self, args):
+        # Python and NumPy floats become rounded Python floats (round(x * scale) is much
+        # faster than round(x, decimals)), everything else - bools too - is kept as it is
+        scale = self._scale
+        return tuple([round(float(x) * scale) / scale if isinstance(x, (float, np.floating)) else x
+                      for x in args])
+
+    def get(self, function, *args):
+        """
+            function(*args) for the quantized args, from the cache when possible
+        """
+        args = self.quantize(args)
+        key = (function, args)
+        now = self.clock() if self.ttl is not None else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (now is None or now - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # calculated outside the lock so a slow price does not block the hits of other threads
+        value = function(*args)
+
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def cached(self, function):
+        # decorator: every call of the function goes through this cache
+        def wrapper(*args):
+            return self.get(function, *args)
+        wrapper.cache = self
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def statistics(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
+
+
+def black_scholes_prices(S, E, T, rf, sigma):
+    # (call, put) of one contract as plain floats
+    call, put = option_prices(S, E, T, rf, sigma)
+    return float(call), float(put)
+
+
+def coupon_bond_price(principal, rate, maturity, interest_rate):
+    # rates in percent as in bond_market
+    return CouponBond(principal, rate, maturity, interest_rate).calculate_price()
+
+
+def vasicek_bond_price(x, r0, kappa, theta, sigma, T):
+    return float(BondPricing(x, r0, kappa, theta, sigma).zero_coupon_prices(T))
+
+
+class CachedPricer:
+    """
+        Closed-form option and bond prices served through a PricingCache (opt-in)
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else PricingCache()
+
+    def option_prices(self, S, E, T, rf, sigma):
+        return self.cache.get(black_scholes_prices, S, E, T, rf, sigma)
+
+    def call_option_price(self, S, E, T, rf, sigma):
+        return self.option_prices(S, E, T, rf, sigma)[0]
+
+    def put_option_price(self, S, E, T, rf, sigma):
+        return self.option_prices(S, E, T, rf, sigma)[1]
+
+    def coupon_bond_price(self, principal, rate, maturity, interest_rate):
+        return self.cache.get(coupon_bond_price, principal, rate, maturity, interest_rate)
+
+    def vasicek_bond_price(self, x, r0, kappa, theta, sigma, T):
+        return self.cache.get(vasicek_bond_price, x, r0, kappa, theta, sigma, T)
+
+
+if __name__ == '__main__':
+
+    pricer = CachedPricer(PricingCache(maxsize=1000, ttl=1.0))
+
+    start = time.perf_counter()
+    for i in range(100000):
+        # sigma only changes after the 6th decimal - every request after the first one is a hit
+        pricer.call_option_price(100.0, 100.0, 1.0, 0.05, 0.2 + (i % 10) * 1e-8)
+    print('Average time per request: %.3f microseconds' % ((time.perf_counter() - start) * 10))
+
+    print('Coupon bond price: %.2f' % pricer.coupon_bond_price(100.0, 10.0, 3, 4.0))
+    print('Vasicek bond price: %.2f' % pricer.vasicek_bond_price(1000.0, 0.1, 0.3, 0.3, 0.03, 1.0))
+    print(pricer.cache.statistics())
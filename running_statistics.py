@@ -0,0 +1,216 @@
+import numpy as np
+from scipy.stats import norm
+
+
+class RunningMoments:
+    """
+        Running mean and variance (Welford) updated chunk by chunk
+
+        Chunks are merged with the parallel form of Welford's algorithm (Chan et al.)
+        so the memory is independent of the number of values seen. Values may be
+        vectors: every column along the first axis is tracked separately.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # sum of the squared deviations from the mean
+        self.m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        n = values.shape[0] if values.ndim else 1
+        if n == 0:
+            return
+        values = values.reshape(n, -1) if values.ndim > 1 else values.reshape(n)
+
+        chunk_mean = values.mean(axis=0)
+        chunk_m2 = ((values - chunk_mean) ** 2).sum(axis=0)
+        delta = chunk_mean - self.mean
+        total = self.count + n
+
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def variance(self):
+        if self.count < 2:
+            return np.full(np.shape(self.mean), np.nan)
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def standard_error(self):
+        return self.std() / np.sqrt(max(self.count, 1))
+
+    def confidence_interval_width(self, confidence=0.95):
+        # width of the two-sided normal confidence interval of the mean
+        return 2 * norm.ppf(0.5 + confidence / 2) * self.standard_error()
+
+
+def simulate_until(sample, chunk_size, max_samples, target_error=None, target_width=None, confidence=0.95):
+    """
+        Calls sample(n) chunk by chunk until the standard error (or the confidence
+        interval width) of the running mean drops below the target
+
+        Only one chunk is in memory at a time. Returns the RunningMoments and the
+        number of samples actually drawn.
+    """
+    moments = RunningMoments()
+    drawn = 0
+
+    while drawn < max_samples:
+        n = min(chunk_size, max_samples - drawn)
+        moments.update(sample(n))
+        drawn += n
+
+        if moments.count < 2:
+            continue
+        if target_error is not None and np.all(moments.standard_error() <= target_error):
+            break
+        if target_width is not None and np.all(moments.confidence_interval_width(confidence) <= target_width):
+            break
+
+    return moments, drawn
+
+
+class WindowMoments:
+    """
+        Mean and covariance of a sliding (or expanding) window of return vectors
+
+        Keeps the count, the sum and the cross product matrix of the rows in the window,
+        so adding or removing k rows is a rank-k update instead of a new covariance.
+    """
+
+    def __init__(self, assets):
+        self.count = 0
+        self.total = np.zeros(assets)
+        self.cross = np.zeros((assets, assets))
+
+    def add(self, rows):
+        rows = np.atleast_2d(rows)
+        self.count += rows.shape[0]
+        self.total += rows.sum(axis=0)
+        self.cross += rows.T @ rows
+
+    def remove(self, rows):
+        rows = np.atleast_2d(rows)
+        self.count -= rows.shape[0]
+        self.total -= rows.sum(axis=0)
+        self.cross -= rows.T @ rows
+
+    def reset(self, rows):
+        # recalculates the sums from scratch - removes the rounding errors of many updates
+        self.count = 0
+        self.total[:] = 0.0
+        self.cross[:] = 0.0
+        self.add(rows)
+
+    def mean(self):
+        return self.total / self.count
+
+    def covariance(self):
+        mean = self.mean()
+        return (self.cross - self.count * np.outer(mean, mean)) / (self.count - 1)
+
+
+class StreamingReturns:
+    """
+        Log returns and their moments for prices arriving one bar or one batch of bars at a time
+
+        Only the last price, the count, the mean, the co-moment matrix and the third and fourth
+        central moment sums are kept; batches are merged with the pairwise update formulas
+        (Chan et al., Pebay), so a snapshot costs nothing however long the history is.
+    """
+
+    def __init__(self, assets):
+        self.count = 0
+        self.last_price = None
+        self.last_return = None
+        self.mean = np.zeros(assets)
+        # sum of the products of the deviations from the mean - the diagonal is M2
+        self.comoment = np.zeros((assets, assets))
+        self.m3 = np.zeros(assets)
+        self.m4 = np.zeros(assets)
+
+    def update(self, prices):
+        """
+            Adds a price vector (one bar) or a (bars x assets) batch, returns the new log returns
+
+            With a single asset a 1-D array is a batch of bars, not one bar.
+        """
+        prices = np.asarray(prices, dtype=float)
+        assets = self.mean.size
+        if prices.size % assets or (prices.ndim > 1 and prices.shape[-1] != assets):
+            raise ValueError("Prices of %d assets expected, got shape %s" % (assets, prices.shape))
+        prices = prices.reshape(-1, assets)
+        if len(prices) == 0:
+            return np.empty((0, assets))
+        if self.last_price is not None:
+            prices = np.vstack([self.last_price, prices])
+        self.last_price = prices[-1]
+        if len(prices) < 2:
+            return np.empty((0, prices.shape[1]))
+
+        returns = np.log(prices[1:] / prices[:-1])
+        self.add_returns(returns)
+        return returns
+
+    def add_returns(self, returns):
+        returns = np.atleast_2d(returns)
+        n = returns.shape[0]
+        batch_mean = returns.mean(axis=0)
+        deviations = returns - batch_mean
+        batch_m2 = np.einsum('ij,ij->j', deviations, deviations)
+        batch_m3 = np.sum(deviations ** 3, axis=0)
+        batch_m4 = np.sum(deviations ** 4, axis=0)
+
+        na, total = self.count, self.count + n
+        delta = batch_mean - self.mean
+        m2 = np.diag(self.comoment).copy()
+
+        self.m4 += batch_m4 + delta ** 4 * na * n * (na ** 2 - na * n + n ** 2) / total ** 3 \
+            + 6 * delta ** 2 * (na ** 2 * batch_m2 + n ** 2 * m2) / total ** 2 \
+            + 4 * delta * (na * batch_m3 - n * self.m3) / total
+        self.m3 += batch_m3 + delta ** 3 * na * n * (na - n) / total ** 2 \
+            + 3 * delta * (na * batch_m2 - n * m2) / total
+        self.comoment += deviations.T @ deviations + np.outer(delta, delta) * na * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.last_return = returns[-1]
+
+    def variance(self):
+        return np.diag(self.covariance())
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def covariance(self):
+        if self.count < 2:
+            return np.full(self.comoment.shape, np.nan)
+        return self.comoment / (self.count - 1)
+
+    def correlation(self):
+        std = self.std()
+        return self.covariance() / np.outer(std, std)
+
+    def skewness(self):
+        m2 = np.diag(self.comoment)
+        return np.sqrt(self.count) * self.m3 / m2 ** 1.5
+
+    def kurtosis(self):
+        # excess kurtosis
+        m2 = np.diag(self.comoment)
+        return self.count * self.m4 / m2 ** 2 - 3
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'last_return': self.last_return,
+            'mean': self.mean.copy(),
+            'std': self.std(),
+            'covariance': self.covariance(),
+            'skewness': self.skewness(),
+            'kurtosis': self.kurtosis(),
+        }